@@ -4,13 +4,19 @@ __all__ = [
     "QErosTraceWidget",
     "QDockableErosConnectWidget",
     "QGraphWidget",
+    "QSpectrumWidget",
     "LoggerConfigWidget",
     "ErosTerminalConfigWidget",
     "QErosTraceConfigWidget",
     "ErosConnectConfigWidget",
+    "TraceStore",
+    "TraceHistoryStore",
 ]
 from .dockable_eros_connect import ErosConnectConfigWidget, QDockableErosConnectWidget
 from .dockable_eros_logger import LoggerConfigWidget, QDockableErosLoggingWidget
 from .dockable_eros_terminal import ErosTerminalConfigWidget, QErosTerminalWidget
 from .dockable_eros_trace import QErosTraceConfigWidget, QErosTraceWidget
 from .dockable_graph import QGraphWidget
+from .dockable_spectrum import QSpectrumWidget
+from .trace_history import TraceHistoryStore
+from .trace_store import TraceStore
@@ -0,0 +1,396 @@
+"""Trace pipeline throughput benchmark.
+
+Feeds synthetic traces through QErosTraceWidget using a stand-in for the Eros object, under the
+Qt offscreen platform, and reports the achieved throughput, the GUI thread latency, the dropped
+frames and the time spent per packet in every stage of the pipeline.
+
+Run it from the directory containing the package, for example:
+
+    python -m eros_qt_widgets.benchmarks.trace_throughput --format csv --rate 1000 --keys 20 --csv --udp
+"""
+
+import argparse
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from qtpy.QtCore import QSettings, Qt, QTimer
+from qtpy.QtWidgets import QApplication, QMainWindow
+
+from ..data_output import CSVOutput, NPZOutput, OutputDispatcher, UDPOutput, ZMQOutput
+from ..data_output.udp_output import UDP_ENCODINGS, UDP_JSON
+from ..dockable_eros_trace import QErosTraceConfigWidget, QErosTraceWidget
+from ..dockable_graph import QGraphWidget
+from ..dockable_spectrum import QSpectrumWidget
+from ..render_scheduler import RenderScheduler
+from ..trace_decoder import BINARY_DATA, BINARY_DESCRIPTOR, TraceDecoder
+from ..trace_stats import TraceStats
+from ..trace_store import TraceStore
+
+FORMATS = ["json", "csv", "binary"]
+
+# Interval of the probe timer measuring the GUI thread latency
+PROBE_INTERVAL_MS = 5
+
+
+class FakeEros:
+    """Stand-in for eros_core.Eros, only supports channel callbacks"""
+
+    def __init__(self) -> None:
+        self.callbacks: Dict[int, List[Callable[[bytes], None]]] = {}
+
+    def attach_channel_callback(self, channel: int, callback: Callable[[bytes], None]):
+        self.callbacks.setdefault(channel, []).append(callback)
+
+    def receive(self, channel: int, packet: bytes):
+        for callback in self.callbacks.get(channel, []):
+            callback(packet)
+
+
+def make_packets(trace_format: str, keys: int, count: int = 1000) -> Tuple[List[bytes], List[bytes], List[str]]:
+    """Return the handshake packets, a set of data packets to cycle through and the key names"""
+    rng = np.random.default_rng(0)
+    values = np.cumsum(rng.normal(size=(count, keys)), axis=0)
+
+    if trace_format == "json":
+        names = [f"key_{i}" for i in range(keys)]
+        packets = [json.dumps(dict(zip(names, row))).encode() for row in values.tolist()]
+        return [], packets, names
+
+    if trace_format == "csv":
+        names = [f"item {i}" for i in range(keys)]
+        packets = [",".join(f"{value:.4f}" for value in row).encode() for row in values.tolist()]
+        return [], packets, names
+
+    if trace_format == "binary":
+        names = [f"key_{i}" for i in range(keys)]
+        descriptor = bytes([BINARY_DESCRIPTOR]) + ",".join(f"{name}:f" for name in names).encode()
+        packer = struct.Struct("<" + "f" * keys)
+        packets = [bytes([BINARY_DATA]) + packer.pack(*row) for row in values.tolist()]
+        return [descriptor], packets, names
+
+    raise ValueError(f"Unknown trace format {trace_format}")
+
+
+class StageTimer:
+    """Accumulates the calls and wall time spent in a patched method"""
+
+    def __init__(self, owner, name: str, count: Callable | None = None) -> None:
+        self.owner = owner
+        self.name = name
+        self.count = count
+        self.calls = 0
+        self.items = 0
+        self.total_ns = 0
+        self.lock = threading.Lock()
+        self.original = getattr(owner, name)
+
+    @property
+    def label(self) -> str:
+        return f"{self.owner.__name__}.{self.name}"
+
+    def install(self):
+        original = self.original
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                with self.lock:
+                    self.calls += 1
+                    self.total_ns += elapsed
+            if self.count is not None:
+                with self.lock:
+                    self.items += self.count(args, result)
+            return result
+
+        setattr(self.owner, self.name, timed)
+
+    def uninstall(self):
+        setattr(self.owner, self.name, self.original)
+
+
+class LatencyProbe:
+    """Measures how late a periodic timer fires on the GUI thread"""
+
+    def __init__(self, interval_ms: int, frame_interval_ms: int) -> None:
+        self.interval = interval_ms / 1000
+        self.frame_interval = frame_interval_ms / 1000
+        self.latencies: List[float] = []
+        self.dropped_frames = 0
+        self.last = time.perf_counter()
+
+        self.timer = QTimer(singleShot=False, interval=interval_ms)  # type: ignore
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        late = max(0.0, now - self.last - self.interval)
+        self.last = now
+
+        self.latencies.append(late)
+        # A stall longer than a frame means the frame timer missed ticks
+        self.dropped_frames += int(late // self.frame_interval)
+
+
+def stage_timers() -> List[StageTimer]:
+    return [
+        StageTimer(TraceDecoder, "decode", count=lambda args, result: len(args[1])),
+        StageTimer(TraceStore, "append_batch", count=lambda args, result: len(args[1])),
+        StageTimer(QErosTraceWidget, "process_frame"),
+        StageTimer(QErosTraceWidget, "update_table"),
+        StageTimer(TraceStats, "update"),
+        StageTimer(RenderScheduler, "render"),
+        StageTimer(QGraphWidget, "refresh"),
+        StageTimer(QSpectrumWidget, "refresh"),
+        StageTimer(OutputDispatcher, "write_batch"),
+        StageTimer(CSVOutput, "write_batches"),
+        StageTimer(UDPOutput, "write_batches"),
+        StageTimer(NPZOutput, "write_batches"),
+        StageTimer(ZMQOutput, "write_batches"),
+    ]
+
+
+def feed_task(eros: FakeEros, channel: int, packets: List[bytes], rate: float, duration: float, sent: List[int]):
+    """Send the packets at the given rate, as fast as possible when the rate is 0"""
+    start = time.perf_counter()
+    index = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+
+        due = len(packets) if rate <= 0 else int(elapsed * rate) - sent[0]
+        for _ in range(max(0, due)):
+            eros.receive(channel, packets[index])
+            index = (index + 1) % len(packets)
+            sent[0] += 1
+
+        if rate > 0:
+            time.sleep(0.001)
+
+
+def run(args: argparse.Namespace) -> dict:
+    # Must be set before the application is created
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication.instance() or QApplication([])
+    work_dir = tempfile.mkdtemp(prefix="eros_trace_bench_")
+
+    timers = stage_timers()
+    for timer in timers:
+        timer.install()
+
+    try:
+        config_widget = QErosTraceConfigWidget()
+        config_widget.data = QErosTraceConfigWidget.Model(
+            csv_path=work_dir,
+            udp_port=args.udp_port,
+            udp_encoding=args.udp_encoding,
+            zmq_address=args.zmq_address,
+            max_point_history=args.history,
+            max_update_rate=args.graph_rate,
+            stats_window=args.stats_window,
+        )
+        settings = QSettings(os.path.join(work_dir, "settings.ini"), QSettings.Format.IniFormat)
+
+        window = QMainWindow()
+        widget = QErosTraceWidget(window, config_widget, settings)
+        window.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, widget)
+
+        handshake, packets, names = make_packets(args.format, args.keys)
+
+        for graph_id in range(1, args.graphs + 1):
+            graph = QGraphWidget(
+                id=graph_id,
+                columns=names[: args.graph_columns],
+                store=widget.store,
+                max_points=args.history,
+                max_update_rate=args.graph_rate,
+            )
+            widget.add_graph(graph)
+
+        for spectrum_id in range(1, args.spectra + 1):
+            spectrum = QSpectrumWidget(id=spectrum_id, columns=names[: args.graph_columns], store=widget.store)
+            widget.add_spectrum(spectrum)
+
+        window.resize(1600, 900)
+        window.show()
+
+        if args.csv:
+            widget.toggle_csv_logging()
+        if args.udp:
+            widget.toggle_udp_output()
+        if args.zmq:
+            widget.toggle_zmq_output()
+        if args.record:
+            widget.toggle_recording()
+
+        eros = FakeEros()
+        widget.set_eros_handle(eros)  # type: ignore
+        for packet in handshake:
+            eros.receive(widget.config.trace_channel, packet)
+
+        probe = LatencyProbe(PROBE_INTERVAL_MS, widget.FRAME_INTERVAL_MS)
+        probe.start()
+
+        sent = [0]
+        feeder = threading.Thread(
+            target=feed_task,
+            args=(eros, widget.config.trace_channel, packets, args.rate, args.duration, sent),
+            daemon=True,
+        )
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        feeder.start()
+
+        # Run the event loop until the feeder is done and the pipeline is drained
+        delivered = timers[1]
+        drain_deadline = None
+        while True:
+            app.processEvents()
+            time.sleep(0.0005)
+
+            if feeder.is_alive():
+                continue
+            if drain_deadline is None:
+                drain_deadline = time.perf_counter() + args.drain_timeout
+            if delivered.items >= sent[0] or time.perf_counter() > drain_deadline:
+                break
+
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+        probe.stop()
+
+        # Sink stats are gone once the outputs are stopped
+        outputs = {}
+        for sink in widget.outputs.sinks:
+            stats = widget.outputs.stats(sink)
+            outputs[sink.name] = {
+                "samples": stats.samples,
+                "busy_ms": stats.busy_ns / 1e6,
+                "max_write_ms": stats.max_write_ns / 1e6,
+                "dropped_samples": stats.dropped,
+                "errors": stats.errors,
+            }
+
+        if args.csv:
+            widget.toggle_csv_logging()
+        if args.udp:
+            widget.toggle_udp_output()
+        if args.zmq:
+            widget.toggle_zmq_output()
+        if args.record:
+            widget.toggle_recording()
+
+        window.close()
+    finally:
+        for timer in timers:
+            timer.uninstall()
+
+    latencies = np.array(probe.latencies) * 1000 if len(probe.latencies) else np.zeros(1)
+    packets_sent = max(sent[0], 1)
+
+    return {
+        "format": args.format,
+        "keys": args.keys,
+        "graphs": args.graphs,
+        "target_rate": args.rate,
+        "duration_s": wall_time,
+        "packets_sent": sent[0],
+        "packets_delivered": delivered.items,
+        "throughput_pps": delivered.items / wall_time,
+        "gui_latency_mean_ms": float(latencies.mean()),
+        "gui_latency_p99_ms": float(np.percentile(latencies, 99)),
+        "gui_latency_max_ms": float(latencies.max()),
+        "dropped_frames": probe.dropped_frames,
+        "cpu_us_per_packet": cpu_time / packets_sent * 1e6,
+        "stages": {
+            timer.label: {
+                "calls": timer.calls,
+                "total_ms": timer.total_ns / 1e6,
+                "us_per_packet": timer.total_ns / packets_sent / 1e3,
+            }
+            for timer in timers
+        },
+        "outputs": outputs,
+    }
+
+
+def print_report(result: dict):
+    print(
+        f"{result['format']} trace, {result['keys']} keys, {result['graphs']} graphs, "
+        f"target {result['target_rate']:g} pkt/s, {result['duration_s']:.1f} s"
+    )
+    print(
+        f"Packets: {result['packets_sent']} sent, {result['packets_delivered']} delivered, "
+        f"{result['throughput_pps']:.0f} pkt/s"
+    )
+    print(
+        f"GUI latency: mean {result['gui_latency_mean_ms']:.2f} ms, p99 {result['gui_latency_p99_ms']:.2f} ms, "
+        f"max {result['gui_latency_max_ms']:.2f} ms, dropped frames {result['dropped_frames']}"
+    )
+    print(f"CPU: {result['cpu_us_per_packet']:.1f} us/packet")
+    print()
+    print(f"{'Stage':<36}{'Calls':>10}{'Total ms':>12}{'us/packet':>12}")
+    for label, stage in result["stages"].items():
+        print(f"{label:<36}{stage['calls']:>10}{stage['total_ms']:>12.1f}{stage['us_per_packet']:>12.2f}")
+
+    if result["outputs"]:
+        print()
+        print(f"{'Output':<16}{'Samples':>10}{'Busy ms':>12}{'Max write ms':>14}{'Dropped':>10}{'Errors':>8}")
+        for name, output in result["outputs"].items():
+            print(
+                f"{name:<16}{output['samples']:>10}{output['busy_ms']:>12.1f}{output['max_write_ms']:>14.2f}"
+                f"{output['dropped_samples']:>10}{output['errors']:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Eros trace pipeline")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--rate", type=float, default=1000, help="Packets per second, 0 for max speed")
+    parser.add_argument("--keys", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5, help="Seconds")
+    parser.add_argument("--graphs", type=int, default=1)
+    parser.add_argument("--spectra", type=int, default=0, help="Spectrum docks")
+    parser.add_argument("--graph-columns", type=int, default=4, help="Keys plotted per graph")
+    parser.add_argument("--graph-rate", type=float, default=15, help="Max graph update rate")
+    parser.add_argument("--history", type=int, default=5000, help="Points kept per key")
+    parser.add_argument("--stats-window", type=int, default=0, help="Rolling statistics window, 0 disables")
+    parser.add_argument("--csv", action="store_true", help="Enable the CSV output")
+    parser.add_argument("--record", action="store_true", help="Enable the columnar recording")
+    parser.add_argument("--udp", action="store_true", help="Enable the UDP output")
+    parser.add_argument("--udp-port", type=int, default=9870)
+    parser.add_argument("--udp-encoding", choices=UDP_ENCODINGS, default=UDP_JSON)
+    parser.add_argument("--zmq", action="store_true", help="Enable the ZMQ publisher")
+    parser.add_argument("--zmq-address", default="tcp://127.0.0.1:5560")
+    parser.add_argument("--drain-timeout", type=float, default=5, help="Seconds to wait for queued packets")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,20 @@
-__all__ = ["CSVOutput", "UDPOutput", "ErosZMQBroker"]
+__all__ = [
+    "BackgroundWriter",
+    "CSVOutput",
+    "NPZOutput",
+    "NPZRecording",
+    "OutputDispatcher",
+    "OutputSink",
+    "SinkStats",
+    "UDPOutput",
+    "ZMQOutput",
+    "ErosZMQBroker",
+]
 
+from .background_writer import BackgroundWriter
 from .csv_output import CSVOutput
+from .npz_output import NPZOutput, NPZRecording
+from .output_sink import OutputDispatcher, OutputSink, SinkStats
 from .udp_output import UDPOutput
 from .zmq_broker import ErosZMQBroker
+from .zmq_output import ZMQOutput
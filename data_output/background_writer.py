@@ -0,0 +1,158 @@
+import logging
+import threading
+from queue import Empty, Full, Queue
+from typing import Callable, List
+
+# What BackgroundWriter.put does when the queue is full
+OVERFLOW_DROP_NEWEST = "drop newest"
+OVERFLOW_DROP_OLDEST = "drop oldest"
+OVERFLOW_BLOCK = "block"
+OVERFLOW_POLICIES = [OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK]
+
+
+class BackgroundWriter:
+    """Hands items to a worker thread through a bounded queue.
+
+    The worker passes everything that is queued to `write` in one call, so the sink sees
+    large chunks instead of single items. When the queue is full the `overflow` policy
+    decides: the new item or the oldest queued one is dropped and counted, or the producer
+    blocks until there is room. `flush` is called when the queue has been idle for
+    `flush_interval` seconds and when the writer is closed.
+
+    `dropped` and `depth` count items, or the units `item_size` returns for each item, like
+    the samples of a batch.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        write: Callable[[List], None],
+        flush: Callable[[], None] | None = None,
+        max_queue: int = 100_000,
+        flush_interval: float = 1,
+        name: str = "background writer",
+        overflow: str = OVERFLOW_DROP_NEWEST,
+        item_size: Callable[[object], int] | None = None,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}")
+
+        self.write = write
+        self.overflow = overflow
+        self.flush = flush
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=max_queue)
+        self.item_size = item_size or (lambda item: 1)
+        self.dropped = 0
+        self.queued = 0
+        self.written = 0
+        self.count_lock = threading.Lock()
+        # Set by close, the overflow policy can evict the sentinel but not this
+        self.stopping = threading.Event()
+        # Once closed put refuses items, so nothing is queued behind the sentinel
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.log = logging.getLogger(name)
+
+        self.thread = threading.Thread(target=self.run, daemon=True, name=name)
+        self.thread.start()
+
+    def put(self, item) -> bool:
+        """Queue an item, returns False when it was dropped or the writer is closed"""
+        with self.lock:
+            if self.closed:
+                return False
+
+            # Counted before it is queued, the worker may take it right away
+            size = self.item_size(item)
+            self._count(queued=size)
+
+            if self.overflow == OVERFLOW_BLOCK:
+                self.queue.put(item)
+                return True
+
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return True
+                except Full:
+                    if self.overflow == OVERFLOW_DROP_NEWEST:
+                        self._count(queued=-size, dropped=size)
+                        return False
+
+                # Make room by dropping the oldest item
+                try:
+                    oldest = self.queue.get_nowait()
+                    if oldest is not self._STOP:
+                        oldest_size = self.item_size(oldest)
+                        self._count(queued=-oldest_size, dropped=oldest_size)
+                except Empty:
+                    pass
+
+    def _count(self, queued: int = 0, dropped: int = 0):
+        with self.count_lock:
+            self.queued += queued
+            self.dropped += dropped
+
+    def depth(self) -> int:
+        return self.queued
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                items = [self.queue.get(timeout=self.flush_interval)]
+            except Empty:
+                if self.stopping.is_set():
+                    break
+                self._flush()
+                continue
+
+            try:
+                while True:
+                    items.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            # A producer can still queue items after close, those are dropped with the sentinel
+            for i, item in enumerate(items):
+                if item is self._STOP:
+                    late = sum(self.item_size(late_item) for late_item in items[i + 1 :])
+                    self._count(queued=-late, dropped=late)
+                    del items[i:]
+                    stopping = True
+                    break
+            self._count(queued=-sum(self.item_size(item) for item in items))
+
+            if len(items) == 0:
+                continue
+
+            try:
+                self.write(items)
+                self.written += len(items)
+            except Exception:
+                self.log.exception("Failed to write %d items", len(items))
+
+        self._flush()
+
+    def _flush(self):
+        if self.flush is None:
+            return
+        try:
+            self.flush()
+        except Exception:
+            self.log.exception("Failed to flush")
+
+    def close(self):
+        """Write everything that is queued and stop the worker"""
+        with self.lock:
+            self.closed = True
+            self.stopping.set()
+            try:
+                # Wakes the worker right away, without it the worker stops once the queue runs empty
+                self.queue.put_nowait(self._STOP)
+            except Full:
+                pass
+        self.thread.join()
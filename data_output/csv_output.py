@@ -1,50 +1,117 @@
 import csv
+import io
 import os
 import time
-from typing import Dict
+from typing import List
 
+from ..trace_decoder import TraceBatch
+from .output_sink import OutputSink
+
+
+class CSVOutput(OutputSink):
+    """Writes trace samples to CSV files.
+
+    Runs as a sink of OutputDispatcher, every batch that queued up is formatted into a
+    single chunk and written at once. A new file (with the header repeated) is started when
+    the current one reaches `rotate_bytes` or is `rotate_seconds` old, 0 disables.
+    """
+
+    name = "csv"
+
+    # Write buffer of the file
+    BUFFER_SIZE = 1 << 20
 
-class CSVOutput:
     target_file_path = None
-    csv_file = None
     lines_received = 0
     skip_every_n_lines = 0
     output_file = None
-    start_time = None
+    start_time_ns = None
     packets_sent = 0
 
     def __init__(self) -> None:
         pass
 
-    def open(self, base_path: str, skip_every_n_lines: int = 0):
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
+    def open(self, base_path: str, skip_every_n_lines: int = 0, rotate_bytes: int = 0, rotate_seconds: float = 0):
+        self.base_path = base_path
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        self.part = 0
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.header = None
 
-        target_file_path = os.path.join(base_path, timestamp + ".csv")
+        # The first file is opened right away, so a bad path is reported to the caller
+        self.open_file()
 
-        self.output_file = open(target_file_path, "w", newline="")
         self.lines_received = 0
         self.skip_every_n_lines = skip_every_n_lines
-        self.start_time = time.time()
-        self.csv_file = csv.writer(self.output_file)
+        self.start_time_ns = time.monotonic_ns()
         self.packets_sent = 0
 
-    def write(self, data: Dict):
-        if self.csv_file is None:
-            return
-        data = data.copy()
-        # add time
-        assert self.start_time is not None
+    def open_file(self):
+        name = self.session if self.part == 0 else f"{self.session}_{self.part:03d}"
+        self.target_file_path = os.path.join(self.base_path, name + ".csv")
+
+        self.output_file = open(self.target_file_path, "w", newline="", buffering=self.BUFFER_SIZE)
+        self.file_size = 0
+        self.file_opened = time.monotonic()
+        self.header_written = False
+
+    def write_batches(self, batches: List[TraceBatch]):
+        """Write the rows of the batches, runs on the sink worker"""
+        assert self.start_time_ns is not None
+
+        rows = []
+        for batch in batches:
+            # Raw records keep their own values, the columns follow the first one
+            if batch.records is None:
+                values = batch.values.tolist()
+                keys = batch.keys
+            else:
+                values = [[*record.values()] for record in batch.records]
+                keys = [*batch.records[0]] if len(batch) > 0 else []
+
+            if self.lines_received == 0 and len(batch) > 0:
+                self.header = [*keys, "time"]
+            times = ((batch.timestamps - self.start_time_ns) / 1e9).tolist()
+
+            for row, timestamp in zip(values, times):
+                if self.lines_received % (1 + self.skip_every_n_lines) == 0:
+                    rows.append([*row, timestamp])
+                self.lines_received += 1
+
+        if len(rows) > 0:
+            self.write_rows(rows)
+
+    def needs_rotation(self) -> bool:
+        if self.rotate_bytes > 0 and self.file_size >= self.rotate_bytes:
+            return True
+        return self.rotate_seconds > 0 and time.monotonic() - self.file_opened >= self.rotate_seconds
+
+    def write_rows(self, rows: List[list]):
+        """Write a chunk of rows"""
+        assert self.output_file is not None
 
-        data["time"] = time.time() - self.start_time
+        if self.needs_rotation():
+            self.output_file.close()
+            self.part += 1
+            self.open_file()
 
-        if self.lines_received == 0:
-            self.csv_file.writerow(data.keys())
+        # Format the chunk in memory, the file then gets a single large write
+        buffer = io.StringIO()
+        csv_file = csv.writer(buffer)
+        if not self.header_written and self.header is not None:
+            csv_file.writerow(self.header)
+            self.header_written = True
+        csv_file.writerows(rows)
 
-        if self.lines_received % (1 + self.skip_every_n_lines) == 0:
-            self.csv_file.writerow(data.values())
-            self.packets_sent += 1
+        text = buffer.getvalue()
+        self.output_file.write(text)
+        self.file_size += len(text)
+        self.packets_sent += len(rows)
 
-        self.lines_received += 1
+    def flush(self):
+        if self.output_file is not None:
+            self.output_file.flush()
 
     def close(self):
         if self.output_file is None:
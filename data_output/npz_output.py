@@ -0,0 +1,237 @@
+import io
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..trace_decoder import TraceBatch
+from .output_sink import OutputSink
+
+# File layout: MAGIC, then per chunk a little-endian uint64 length followed by a compressed
+# .npz, and when the recording was closed properly a JSON index, its uint64 length and
+# INDEX_MAGIC. Every chunk holds a "time" array (seconds since the recording started), a
+# "keys" array and one "c<i>" float64 column per key, NaN where a key was not received.
+MAGIC = b"EROSTRC1"
+INDEX_MAGIC = b"EROSIDX1"
+_LENGTH = struct.Struct("<Q")
+
+
+class NPZOutput(OutputSink):
+    """Records trace batches as compressed, columnar chunks with an index footer.
+
+    Runs as a sink of OutputDispatcher, which collects the batches into chunks of
+    `chunk_rows` samples (or whatever arrived within CHUNK_SECONDS) and compresses them off
+    the decode thread. The index lists the offset, time range and keys of every chunk, so a
+    reader can seek straight to a time range, see NPZRecording.
+    """
+
+    name = "recording"
+
+    CHUNK_ROWS = 10_000
+    # A chunk is written at least this often, so a crash loses little
+    CHUNK_SECONDS = 10
+
+    target_file_path = None
+    output_file = None
+    start_time_ns = None
+    samples_written = 0
+
+    def __init__(self) -> None:
+        pass
+
+    def open(self, base_path: str, chunk_rows: int = CHUNK_ROWS):
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self.target_file_path = os.path.join(base_path, timestamp + ".trace")
+
+        self.output_file = open(self.target_file_path, "wb")
+        self.output_file.write(MAGIC)
+
+        self.chunk_rows = chunk_rows
+        self.index = []
+        self.pending: List[TraceBatch] = []
+        self.pending_rows = 0
+        self.pending_since = time.monotonic()
+
+        self.start_time_ns = time.monotonic_ns()
+        self.start_wall_time = time.time()
+        self.samples_written = 0
+
+    def write_batches(self, batches: List[TraceBatch]):
+        """Collect batches into chunks, runs on the sink worker"""
+        if self.pending_rows == 0:
+            self.pending_since = time.monotonic()
+
+        self.pending.extend(batches)
+        self.pending_rows += sum(len(batch) for batch in batches)
+
+        if self.pending_rows >= self.chunk_rows:
+            self.write_chunk()
+        else:
+            self.flush()
+
+    def flush(self):
+        if self.pending_rows > 0 and time.monotonic() - self.pending_since >= self.CHUNK_SECONDS:
+            self.write_chunk()
+
+    def write_chunk(self):
+        batch = TraceBatch.concat(self.pending)
+        self.pending = []
+        self.pending_rows = 0
+
+        # A backlog of batches is split into chunks of at most chunk_rows
+        for first in range(0, len(batch), self.chunk_rows):
+            last = first + self.chunk_rows
+            self.write_rows(batch.keys, batch.values[first:last], batch.timestamps[first:last])
+
+    def write_rows(self, keys: List[str], values: np.ndarray, timestamps: np.ndarray):
+        assert self.output_file is not None and self.start_time_ns is not None
+
+        times = (timestamps - self.start_time_ns) / 1e9
+        columns = {f"c{i}": values[:, i] for i in range(len(keys))}
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, time=times, keys=np.array(keys, dtype=str), **columns)
+        data = buffer.getvalue()
+
+        self.output_file.write(_LENGTH.pack(len(data)))
+        offset = self.output_file.tell()
+        self.output_file.write(data)
+
+        self.index.append(
+            {
+                "offset": offset,
+                "size": len(data),
+                "rows": len(times),
+                "start": float(times[0]),
+                "stop": float(times[-1]),
+                "keys": keys,
+            }
+        )
+        self.samples_written += len(times)
+
+    def close(self):
+        if self.output_file is None:
+            return
+
+        # Write the last partial chunk and the index
+        self.write_chunk()
+
+        footer = json.dumps(
+            {
+                "version": 1,
+                "start_time_ns": self.start_time_ns,
+                "start_wall_time": self.start_wall_time,
+                "chunks": self.index,
+            }
+        ).encode()
+        self.output_file.write(footer)
+        self.output_file.write(_LENGTH.pack(len(footer)))
+        self.output_file.write(INDEX_MAGIC)
+
+        self.output_file.close()
+        self.output_file = None
+
+    def is_open(self) -> bool:
+        return self.output_file is not None
+
+    def get_logged_samples(self) -> int:
+        return self.samples_written
+
+
+class NPZRecording:
+    """Reads a recording written by NPZOutput.
+
+    The file is memory mapped and only the chunks overlapping the requested time range are
+    decompressed. Recordings that were not closed properly have no index, it is then rebuilt
+    by walking the chunks.
+
+        recording = NPZRecording("20240101-120000.trace")
+        time, values = recording.read(start=60, stop=120, keys=["item 0"])
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.map[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a trace recording")
+
+        if self.map[-len(INDEX_MAGIC) :] == INDEX_MAGIC:
+            end = len(self.map) - len(INDEX_MAGIC) - _LENGTH.size
+            (length,) = _LENGTH.unpack(self.map[end : end + _LENGTH.size])
+            self.info = json.loads(self.map[end - length : end])
+            self.chunks = self.info["chunks"]
+        else:
+            self.info = {}
+            self.chunks = self.scan()
+
+    def scan(self) -> List[Dict]:
+        chunks = []
+        offset = len(MAGIC)
+        while offset + _LENGTH.size <= len(self.map):
+            (size,) = _LENGTH.unpack(self.map[offset : offset + _LENGTH.size])
+            offset += _LENGTH.size
+            if offset + size > len(self.map):
+                # Truncated last chunk
+                break
+
+            chunk = {"offset": offset, "size": size}
+            with self.load(chunk) as data:
+                times = data["time"]
+                chunk.update(rows=len(times), start=float(times[0]), stop=float(times[-1]), keys=data["keys"].tolist())
+
+            chunks.append(chunk)
+            offset += size
+        return chunks
+
+    @property
+    def keys(self) -> List[str]:
+        keys = {}
+        for chunk in self.chunks:
+            keys.update(dict.fromkeys(chunk["keys"]))
+        return list(keys)
+
+    def load(self, chunk: Dict):
+        return np.load(io.BytesIO(self.map[chunk["offset"] : chunk["offset"] + chunk["size"]]))
+
+    def read(
+        self, start: float | None = None, stop: float | None = None, keys: List[str] | None = None
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Samples between start and stop (seconds since the recording started) of the given keys"""
+        start = -np.inf if start is None else start
+        stop = np.inf if stop is None else stop
+        keys = self.keys if keys is None else keys
+
+        times = []
+        values = {key: [] for key in keys}
+        for chunk in self.chunks:
+            if chunk["stop"] < start or chunk["start"] > stop:
+                continue
+
+            with self.load(chunk) as data:
+                chunk_times = data["time"]
+                selected = (chunk_times >= start) & (chunk_times <= stop)
+                times.append(chunk_times[selected])
+
+                # Only the requested columns are decompressed
+                columns = {key: i for i, key in enumerate(chunk["keys"])}
+                for key in keys:
+                    if key in columns:
+                        values[key].append(data[f"c{columns[key]}"][selected])
+                    else:
+                        values[key].append(np.full(int(selected.sum()), np.nan))
+
+        if len(times) == 0:
+            return np.empty(0), {key: np.empty(0) for key in keys}
+
+        return np.concatenate(times), {key: np.concatenate(columns) for key, columns in values.items()}
+
+    def close(self):
+        self.map.close()
+        self.file.close()
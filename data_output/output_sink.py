@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List
+
+from ..trace_decoder import TraceBatch
+from .background_writer import OVERFLOW_DROP_NEWEST, BackgroundWriter
+
+
+class OutputSink(ABC):
+    """Base class of the data outputs fed by OutputDispatcher.
+
+    Every sink added to a dispatcher gets its own worker thread and queue. `write_batches`
+    runs on that thread with all the batches that arrived since the previous call, so a
+    slow sink only delays itself. `flush` is called when no batches arrived for
+    `flush_interval` seconds and `close` once the queue has been drained after removal.
+
+        class InfluxOutput(OutputSink):
+            name = "influx"
+
+            def write_batches(self, batches):
+                ...
+
+        widget.outputs.add(InfluxOutput())
+    """
+
+    name = "output"
+
+    # Batches waiting for the sink, `overflow` decides what happens beyond that
+    max_queue = 10_000
+    overflow = OVERFLOW_DROP_NEWEST
+    flush_interval: float = 1
+
+    @abstractmethod
+    def write_batches(self, batches: List[TraceBatch]): ...
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@dataclass
+class SinkStats:
+    """Work done by one sink, updated by its worker thread"""
+
+    batches: int = 0
+    samples: int = 0
+    # Time spent in write_batches and flush
+    busy_ns: int = 0
+    max_write_ns: int = 0
+    errors: int = 0
+    last_error: str = ""
+    # Samples dropped because the queue was full and samples waiting right now
+    dropped: int = 0
+    queued: int = 0
+
+
+class _SinkWorker:
+    def __init__(self, sink: OutputSink) -> None:
+        self.sink = sink
+        self.enabled = True
+        self.stats = SinkStats()
+        self.log = logging.getLogger(f"{sink.name} output")
+        self.writer = BackgroundWriter(
+            self.write,
+            self.flush,
+            sink.max_queue,
+            flush_interval=sink.flush_interval,
+            name=f"{sink.name} output",
+            overflow=sink.overflow,
+            item_size=len,
+        )
+
+    def write(self, batches: List[TraceBatch]):
+        start = time.perf_counter_ns()
+        try:
+            self.sink.write_batches(batches)
+        except Exception as e:
+            self.failed(e, "write")
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self.stats.busy_ns += elapsed
+            self.stats.max_write_ns = max(self.stats.max_write_ns, elapsed)
+
+        self.stats.batches += len(batches)
+        self.stats.samples += sum(len(batch) for batch in batches)
+
+    def flush(self):
+        start = time.perf_counter_ns()
+        try:
+            self.sink.flush()
+        except Exception as e:
+            self.failed(e, "flush")
+        finally:
+            self.stats.busy_ns += time.perf_counter_ns() - start
+
+    def failed(self, error: Exception, action: str):
+        # Only the first failure is logged with a trace, a broken sink would flood the log
+        if self.stats.errors == 0:
+            self.log.exception("Failed to %s", action)
+        self.stats.errors += 1
+        self.stats.last_error = repr(error)
+
+
+class OutputDispatcher:
+    """Fans decoded batches out to the registered sinks.
+
+    `write_batch` only queues the batch for every enabled sink, it is safe to call from the
+    decode thread while sinks are added and removed from the GUI thread. A sink that raises
+    is counted in its stats and keeps receiving batches, the other sinks are not affected.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # Replaced rather than modified, so write_batch can iterate without the lock
+        self.workers: List[_SinkWorker] = []
+
+    def add(self, sink: OutputSink):
+        with self.lock:
+            if self._find(sink) is not None:
+                return
+            self.workers = [*self.workers, _SinkWorker(sink)]
+
+    def remove(self, sink: OutputSink):
+        """Stop feeding the sink, write what is still queued and close it"""
+        with self.lock:
+            worker = self._find(sink)
+            if worker is None:
+                return
+            worker.enabled = False
+            self.workers = [other for other in self.workers if other is not worker]
+
+        worker.writer.close()
+        try:
+            sink.close()
+        except Exception as e:
+            worker.failed(e, "close")
+
+    def set_enabled(self, sink: OutputSink, enabled: bool):
+        """A disabled sink stays open but gets no batches"""
+        worker = self._find(sink)
+        if worker is not None:
+            worker.enabled = enabled
+
+    def is_enabled(self, sink: OutputSink) -> bool:
+        worker = self._find(sink)
+        return worker is not None and worker.enabled
+
+    def __contains__(self, sink: OutputSink) -> bool:
+        return self._find(sink) is not None
+
+    @property
+    def sinks(self) -> List[OutputSink]:
+        return [worker.sink for worker in self.workers]
+
+    def write_batch(self, batch: TraceBatch):
+        if len(batch) == 0:
+            return
+
+        for worker in self.workers:
+            if worker.enabled:
+                worker.writer.put(batch)
+
+    def stats(self, sink: OutputSink) -> SinkStats:
+        worker = self._find(sink)
+        if worker is None:
+            return SinkStats()
+
+        worker.stats.dropped = worker.writer.dropped
+        worker.stats.queued = worker.writer.depth()
+        return worker.stats
+
+    def close(self):
+        for sink in self.sinks:
+            self.remove(sink)
+
+    def _find(self, sink: OutputSink) -> _SinkWorker | None:
+        for worker in self.workers:
+            if worker.sink is sink:
+                return worker
+        return None
@@ -1,27 +1,117 @@
 import datetime
 import json
+import os
+import select
 import socket
+import struct
+import time
+from typing import List
 
+import numpy as np
+
+from ..trace_decoder import MONOTONIC_TO_WALL_NS, TraceBatch
+from .background_writer import OVERFLOW_DROP_OLDEST
+from .output_sink import OutputSink
+
+# One JSON object per sample, as PlotJuggler expects
+UDP_JSON = "json"
+# JSON {"samples": [...]} with as many samples as fit in a datagram
+UDP_JSON_BATCH = "json batch"
+# Packed float64 rows described by a schema datagram, see below
+UDP_BINARY = "binary"
+UDP_ENCODINGS = [UDP_JSON, UDP_JSON_BATCH, UDP_BINARY]
+
+# Binary datagrams, all little-endian. A schema datagram is SCHEMA_HEADER (kind, session,
+# schema id) followed by a JSON object with the column names; a data datagram is DATA_HEADER
+# (kind, session, schema id, rows) followed by rows of float64 columns. The first column is
+# the wall clock time in seconds, NaN marks a missing value. The session id is random per
+# open, the schema id changes whenever the keys do.
+UDP_SCHEMA = 0x01
+UDP_DATA = 0x02
+SCHEMA_HEADER = struct.Struct("<BIH")
+DATA_HEADER = struct.Struct("<BIHH")
+
+
+class UDPOutput(OutputSink):
+    """Sends trace samples as UDP datagrams.
+
+    The json encoding sends one datagram per sample. The batched encodings pack as many
+    samples as fit in `mtu` bytes into each datagram, a partly filled datagram is sent once
+    its oldest sample is `flush_interval` seconds old.
+
+    Runs as a sink of OutputDispatcher and sends on a non-blocking socket. When the socket
+    buffer stays full the datagram is dropped, the queue then fills up and `overflow`
+    decides what is dropped next, see BackgroundWriter.
+    """
+
+    name = "udp"
+
+    # Payload bytes per datagram, stays below the usual Ethernet MTU
+    MTU = 1400
+    FLUSH_INTERVAL = 0.01
+    # The binary schema is repeated at this interval, so a late receiver can decode
+    SCHEMA_INTERVAL = 1
+    # How long a send waits for room in the socket buffer
+    SEND_TIMEOUT = 0.1
 
-class UDPOutput:
     ip = None
     port = None
     sock = None
     packets_logged = 0
+    datagrams_sent = 0
+    datagrams_dropped = 0
+
+    # Formatted date and time of the last second sent, only the microseconds change within it
+    _time_prefix_second = None
+    _time_prefix = ""
 
     def __init__(self) -> None:
         pass
 
-    def open(self, ip: str, port: int):
+    def open(
+        self,
+        ip: str,
+        port: int,
+        encoding: str = UDP_JSON,
+        mtu: int = MTU,
+        flush_interval: float = FLUSH_INTERVAL,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+    ):
+        if encoding not in UDP_ENCODINGS:
+            raise ValueError(f"Unknown UDP encoding {encoding}")
+
         self.ip = ip
         self.port = port
+        self.encoding = encoding
+        self.mtu = mtu
+        # Also the idle time after which the dispatcher calls flush
+        self.flush_interval = max(flush_interval, 0.001)
+        self.overflow = overflow
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
         self.packets_logged = 0
+        self.datagrams_sent = 0
+        self.datagrams_dropped = 0
 
-    def write(self, data: dict, timestamp=None):
-        if self.sock is None:
+        self.pending: List[TraceBatch] = []
+
+        self.session = int.from_bytes(os.urandom(4), "little")
+        self.schema_id = 0
+        self.schema_keys = None
+        self.schema_sent = 0.0
+
+    def write_batches(self, batches: List[TraceBatch]):
+        """Send the batches, runs on the sink worker"""
+        if self.encoding == UDP_JSON:
+            for batch in batches:
+                for obj, timestamp in zip(batch.to_records(), batch.timestamps.tolist()):
+                    self.send_sample(obj, timestamp)
             return
 
+        self.pending.extend(batches)
+        self.flush(force=False)
+
+    def send_sample(self, data: dict, timestamp_ns: int):
         data = data.copy()
 
         # Try to convert all values to floats
@@ -32,16 +122,118 @@ class UDPOutput:
                 pass
 
         packet = {}
-        packet["time"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S,%f") if timestamp is None else timestamp
+        packet["time"] = self.format_time(timestamp_ns)
         packet["data"] = data
 
-        self.sock.sendto(json.dumps(packet).encode("utf-8"), (self.ip, self.port))
+        self.send(json.dumps(packet).encode("utf-8"))
         self.packets_logged += 1
 
+    def flush(self, force: bool = True):
+        """Send the pending samples, a partly filled datagram only when forced or old enough"""
+        if self.sock is None or len(self.pending) == 0:
+            return
+
+        batch = TraceBatch.concat(self.pending)
+        self.pending = []
+
+        # The age of the oldest sample counts from when it was received
+        force = force or time.monotonic_ns() - int(batch.timestamps[0]) >= self.flush_interval * 1e9
+
+        if self.encoding == UDP_BINARY:
+            sent = self.send_binary(batch, force)
+        else:
+            sent = self.send_json(batch, force)
+
+        if sent < len(batch):
+            self.pending = [_slice(batch, sent)]
+        self.packets_logged += sent
+
+    def send_binary(self, batch: TraceBatch, force: bool) -> int:
+        now = time.monotonic()
+        if batch.keys != self.schema_keys:
+            self.schema_id = (self.schema_id + 1) & 0xFFFF
+            self.schema_keys = batch.keys
+            self.schema_sent = 0.0
+
+        if now - self.schema_sent >= self.SCHEMA_INTERVAL:
+            schema = json.dumps({"columns": ["time", *batch.keys]}).encode()
+            self.send(SCHEMA_HEADER.pack(UDP_SCHEMA, self.session, self.schema_id) + schema)
+            self.schema_sent = now
+
+        rows = np.empty((len(batch), len(batch.keys) + 1), dtype="<f8")
+        rows[:, 0] = (batch.timestamps + MONOTONIC_TO_WALL_NS) / 1e9
+        rows[:, 1:] = batch.values
+
+        row_size = rows.shape[1] * rows.itemsize
+        per_datagram = max((self.mtu - DATA_HEADER.size) // row_size, 1)
+        count = len(rows) if force else len(rows) // per_datagram * per_datagram
+
+        for first in range(0, count, per_datagram):
+            chunk = rows[first : min(first + per_datagram, count)]
+            self.send(DATA_HEADER.pack(UDP_DATA, self.session, self.schema_id, len(chunk)) + chunk.tobytes())
+        return count
+
+    def send_json(self, batch: TraceBatch, force: bool) -> int:
+        if batch.records is not None:
+            records = batch.records
+        else:
+            # Missing values are left out, NaN is not valid JSON
+            records = [
+                {key: value for key, value in zip(batch.keys, row) if value == value} for row in batch.values.tolist()
+            ]
+
+        samples = [
+            json.dumps({"time": self.format_time(timestamp), "data": data})
+            for data, timestamp in zip(records, batch.timestamps.tolist())
+        ]
+
+        prefix, suffix = '{"samples": [', "]}"
+        sent = 0
+        first = 0
+        size = len(prefix) + len(suffix)
+        for i, sample in enumerate(samples):
+            if i > first and size + len(sample) + 2 > self.mtu:
+                self.send((prefix + ", ".join(samples[first:i]) + suffix).encode())
+                sent = first = i
+                size = len(prefix) + len(suffix)
+            size += len(sample) + 2
+
+        if force:
+            self.send((prefix + ", ".join(samples[first:]) + suffix).encode())
+            sent = len(samples)
+        return sent
+
+    def send(self, datagram: bytes):
+        assert self.sock is not None
+        for attempt in range(2):
+            try:
+                self.sock.sendto(datagram, (self.ip, self.port))
+                self.datagrams_sent += 1
+                return
+            except BlockingIOError:
+                # The socket buffer is full, give it a moment to drain
+                if attempt == 0:
+                    select.select([], [self.sock], [], self.SEND_TIMEOUT)
+            except ConnectionRefusedError:
+                # Nobody is listening on the port right now
+                break
+        self.datagrams_dropped += 1
+
+    def format_time(self, timestamp_ns: int) -> str:
+        """Format a monotonic stamp as wall clock time, "%Y-%m-%d %H:%M:%S,%f" """
+        second, microsecond = divmod((timestamp_ns + MONOTONIC_TO_WALL_NS) // 1000, 1_000_000)
+
+        if second != self._time_prefix_second:
+            self._time_prefix_second = second
+            self._time_prefix = datetime.datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+
+        return f"{self._time_prefix},{microsecond:06d}"
+
     def close(self):
         if self.sock is None:
             return
 
+        self.flush()
         self.sock.close()
         self.sock = None
 
@@ -50,3 +242,18 @@ class UDPOutput:
 
     def get_logged_packets(self) -> int:
         return self.packets_logged
+
+    def get_sent_datagrams(self) -> int:
+        return self.datagrams_sent
+
+    def get_dropped_datagrams(self) -> int:
+        return self.datagrams_dropped
+
+
+def _slice(batch: TraceBatch, start: int) -> TraceBatch:
+    return TraceBatch(
+        keys=batch.keys,
+        values=batch.values[start:],
+        timestamps=batch.timestamps[start:],
+        records=batch.records[start:] if batch.records is not None else None,
+    )
@@ -0,0 +1,136 @@
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+import zmq as pyzmq
+
+from ..trace_decoder import MONOTONIC_TO_WALL_NS, TraceBatch
+from .output_sink import OutputSink
+
+# Every message starts with this, followed by the key group and a closing slash, so
+# subscribing to "trace/motor/" does not also match "trace/motor2/"
+TOPIC_PREFIX = "trace/"
+
+
+class ZMQOutput(OutputSink):
+    """Publishes decoded trace samples on a ZMQ PUB socket.
+
+    Keys are grouped by the part of their name before `group_separator` ("motor.speed" and
+    "motor.current" go to "trace/motor/"), keys without it form a group of their own. Each
+    write sends one multipart message per group:
+
+        [topic, header, time, values]
+
+    header is JSON with "keys", "rows" and the dtype and shape of the two arrays. time holds
+    the wall clock receive time of every sample as int64 nanoseconds, values is float64
+    with one row per key (NaN where a sample lacks the key). The arrays are sent without
+    copying, a subscriber can wrap them again with np.frombuffer.
+
+        socket.subscribe("trace/motor/")
+        topic, header, time, values = socket.recv_multipart()
+        header = json.loads(header)
+        values = np.frombuffer(values, header["dtype"]).reshape(header["shape"])
+    """
+
+    name = "zmq"
+
+    # Messages buffered per subscriber, PUB drops beyond that
+    SEND_HWM = 1000
+    # Key sets whose grouping is cached, JSON traces with varying keys would grow it forever
+    MAX_CACHED_GROUPS = 64
+
+    address = None
+    socket = None
+    samples_sent = 0
+    messages_sent = 0
+
+    def __init__(self) -> None:
+        self.context = pyzmq.Context.instance()
+
+    def open(self, address: str, group_separator: str = "."):
+        self.address = address
+        self.group_separator = group_separator
+        self.groups: Dict[Tuple[str, ...], List[Tuple[bytes, List[int]]]] = {}
+
+        socket = self.context.socket(pyzmq.PUB)
+        socket.setsockopt(pyzmq.SNDHWM, self.SEND_HWM)
+        socket.setsockopt(pyzmq.LINGER, 0)
+        try:
+            socket.bind(address)
+        except pyzmq.ZMQError:
+            socket.close()
+            raise
+        self.socket = socket
+
+        self.samples_sent = 0
+        self.messages_sent = 0
+
+    def key_groups(self, keys: List[str]) -> List[Tuple[bytes, List[int]]]:
+        """Topic and column indices of every key group, cached per key set"""
+        cached = self.groups.get(tuple(keys))
+        if cached is not None:
+            return cached
+
+        columns: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            group = key.split(self.group_separator, 1)[0] if self.group_separator else key
+            columns.setdefault(group, []).append(i)
+
+        groups = [(f"{TOPIC_PREFIX}{group}/".encode(), index) for group, index in columns.items()]
+        if len(self.groups) >= self.MAX_CACHED_GROUPS:
+            self.groups.clear()
+        self.groups[tuple(keys)] = groups
+        return groups
+
+    def write_batches(self, batches: List[TraceBatch]):
+        """Publish the batches as one message per key group, runs on the sink worker"""
+        assert self.socket is not None
+
+        batch = TraceBatch.concat(batches)
+        if len(batch) == 0:
+            return
+
+        times = np.ascontiguousarray(batch.timestamps + MONOTONIC_TO_WALL_NS, dtype="<i8")
+        # One row per key, so a subscriber gets every signal as a contiguous array
+        values = np.ascontiguousarray(batch.values.T, dtype="<f8")
+
+        for topic, index in self.key_groups(batch.keys):
+            group_values = values[index[0] : index[-1] + 1] if _is_range(index) else values[index]
+            header = {
+                "keys": [batch.keys[i] for i in index],
+                "rows": len(batch),
+                "time_dtype": times.dtype.str,
+                "dtype": group_values.dtype.str,
+                "shape": list(group_values.shape),
+            }
+            try:
+                self.socket.send_multipart(
+                    [topic, json.dumps(header).encode(), times, group_values], flags=pyzmq.NOBLOCK, copy=False
+                )
+            except pyzmq.Again:
+                # No room left at the high water mark, drop like PUB does for slow subscribers
+                continue
+            self.messages_sent += 1
+
+        self.samples_sent += len(batch)
+
+    def close(self):
+        if self.socket is None:
+            return
+
+        self.socket.close()
+        self.socket = None
+
+    def is_open(self) -> bool:
+        return self.socket is not None
+
+    def get_sent_samples(self) -> int:
+        return self.samples_sent
+
+    def get_sent_messages(self) -> int:
+        return self.messages_sent
+
+
+def _is_range(index: List[int]) -> bool:
+    # Consecutive columns are sliced, which keeps the payload a view instead of a copy
+    return index[-1] - index[0] + 1 == len(index)
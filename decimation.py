@@ -0,0 +1,118 @@
+from typing import Tuple
+
+import numpy as np
+
+DECIMATION_NONE = "none"
+DECIMATION_MINMAX = "minmax"
+DECIMATION_LTTB = "lttb"
+DECIMATION_MODES = [DECIMATION_NONE, DECIMATION_MINMAX, DECIMATION_LTTB]
+
+
+def _argmin(blocks: np.ndarray, has_nan: bool) -> np.ndarray:
+    if has_nan:
+        blocks = np.where(np.isnan(blocks), np.inf, blocks)
+    return np.argmin(blocks, axis=1)
+
+
+def _argmax(blocks: np.ndarray, has_nan: bool) -> np.ndarray:
+    if has_nan:
+        blocks = np.where(np.isnan(blocks), -np.inf, blocks)
+    return np.argmax(blocks, axis=1)
+
+
+def _mean(blocks: np.ndarray, has_nan: bool) -> np.ndarray:
+    if not has_nan:
+        return blocks.mean(axis=1)
+
+    valid = ~np.isnan(blocks)
+    sums = np.where(valid, blocks, 0).sum(axis=1)
+    counts = valid.sum(axis=1)
+    return np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
+
+
+def decimate_minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the minimum and maximum of every bucket, in time order.
+
+    Preserves the envelope of the signal, so spikes remain visible at any zoom level.
+    """
+    n = len(y)
+    if buckets <= 0 or n <= 2 * buckets:
+        return x, y
+
+    has_nan = bool(np.isnan(y).any())
+
+    # Equal sized buckets, the few leftover (oldest) points form an extra bucket
+    size = n // buckets
+    head = n - size * buckets
+
+    blocks = y[head:].reshape(buckets, size)
+    offsets = head + np.arange(buckets) * size
+    index = [_argmin(blocks, has_nan) + offsets, _argmax(blocks, has_nan) + offsets]
+
+    if head > 0:
+        head_block = y[:head].reshape(1, head)
+        index += [_argmin(head_block, has_nan), _argmax(head_block, has_nan)]
+
+    index = np.unique(np.concatenate(index))
+    return x[index], y[index]
+
+
+def decimate_lttb(x: np.ndarray, y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest triangle three buckets downsampling to about the given number of points.
+
+    Vectorized variant: the triangle of each bucket is anchored on the averages of the
+    neighbouring buckets, instead of on the point selected in the previous bucket, so all
+    the buckets are evaluated at once.
+    """
+    n = len(y)
+    if points < 3 or n <= points:
+        return x, y
+
+    has_nan = bool(np.isnan(y).any())
+
+    # The first and last points are always kept, the inner points are bucketed
+    buckets = points - 2
+    size = (n - 2) // buckets
+    head = (n - 2) - size * buckets
+
+    block_x = x[1 + head : -1].reshape(buckets, size)
+    block_y = y[1 + head : -1].reshape(buckets, size)
+    mean_x = block_x.mean(axis=1)
+    mean_y = _mean(block_y, has_nan)
+
+    # The leftover (oldest) points form an extra bucket in front
+    first_x, first_y = x[:1], y[:1]
+    if head > 0:
+        first_x = x[1 : 1 + head].mean(keepdims=True)
+        first_y = _mean(y[1 : 1 + head].reshape(1, head), has_nan)
+
+    # Previous and next anchors of every bucket
+    prev_x = np.concatenate((first_x, mean_x[:-1]))[:, None]
+    prev_y = np.concatenate((first_y, mean_y[:-1]))[:, None]
+    next_x = np.concatenate((mean_x[1:], x[-1:]))[:, None]
+    next_y = np.concatenate((mean_y[1:], y[-1:]))[:, None]
+
+    # Twice the triangle area, expanded to a linear function of the point per bucket
+    slope_y = prev_x - next_x
+    slope_x = next_y - prev_y
+    offset = -slope_y * prev_y - prev_x * slope_x
+    area = np.abs(block_y * slope_y + block_x * slope_x + offset)
+    index = [[0], _argmax(area, has_nan) + 1 + head + np.arange(buckets) * size, [n - 1]]
+
+    if head > 0:
+        head_x = x[1 : 1 + head].reshape(1, head)
+        head_y = y[1 : 1 + head].reshape(1, head)
+        area = np.abs((x[0] - mean_x[0]) * (head_y - y[0]) - (x[0] - head_x) * (mean_y[0] - y[0]))
+        index.insert(1, _argmax(area, has_nan) + 1)
+
+    index = np.concatenate(index)
+    return x[index], y[index]
+
+
+def decimate(x: np.ndarray, y: np.ndarray, points: int, mode: str = DECIMATION_MINMAX) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce a series to about the given number of points"""
+    if mode == DECIMATION_MINMAX:
+        return decimate_minmax(x, y, points // 2)
+    if mode == DECIMATION_LTTB:
+        return decimate_lttb(x, y, points)
+    return x, y
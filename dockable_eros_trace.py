@@ -1,4 +1,5 @@
-import json
+import functools
+import logging
 import os
 import time
 from typing import List
@@ -6,10 +7,12 @@ from typing import List
 from eros_core import Eros, TransportStates
 from pydantic import BaseModel
 from qt_settings import QGenericSettingsWidget
-from qtpy.QtCore import QSettings, Qt, QTimer, Signal
+from qtpy.QtCore import QSettings, Qt, QTimer
 from qtpy.QtGui import QAction, QFont
 from qtpy.QtWidgets import (
+    QApplication,
     QCheckBox,
+    QComboBox,
     QDockWidget,
     QDoubleSpinBox,
     QFileDialog,
@@ -18,21 +21,36 @@ from qtpy.QtWidgets import (
     QLineEdit,
     QSpinBox,
     QStyle,
-    QTreeWidget,
-    QTreeWidgetItem,
+    QTreeView,
     QWidget,
 )
+from zmq import ZMQError
 
-from .data_output import CSVOutput, UDPOutput
+from .data_output import CSVOutput, NPZOutput, OutputDispatcher, OutputSink, UDPOutput, ZMQOutput
+from .data_output.background_writer import OVERFLOW_DROP_OLDEST, OVERFLOW_POLICIES
+from .data_output.udp_output import UDP_ENCODINGS, UDP_JSON
+from .decimation import DECIMATION_MODES
 from .dockable_graph import QGraphWidget
+from .dockable_spectrum import QSpectrumWidget
+from .render_scheduler import RenderScheduler
+from .trace_decoder import BINARY_DESCRIPTOR, TraceDecoder
+from .trace_history import TraceHistoryStore
+from .trace_replay import TraceReplay
+from .trace_stats import TraceStats
+from .trace_store import TraceStore
+from .trace_table_model import TraceTableModel
+from .trace_worker import TraceDecodeWorker
 from .ui.eros_trace import Ui_Form
 
 
 class QErosTraceWidget(QDockWidget):
     eros_handle: Eros | None = None
 
-    data_signal = Signal(bytes)
-    last_update = time.time()
+    # Interval at which decoded batches are moved to the GUI
+    FRAME_INTERVAL_MS = 33
+
+    # Playback speed per entry of the replay speed box, 0 replays as fast as possible
+    REPLAY_SPEEDS = [0.5, 1, 2, 5, 10, 0]
 
     csv_output: CSVOutput
 
@@ -42,109 +60,245 @@ class QErosTraceWidget(QDockWidget):
         self.main_widget = QWidget()
         self.config = config_widget.data
         self.graphs: List[QGraphWidget] = []
+        self.spectra: List[QSpectrumWidget] = []
         self.settings = settings
 
         self.csv_output = CSVOutput()
         self.udp_output = UDPOutput()
-        self.start_time = time.time()
+        self.npz_output = NPZOutput()
+        self.zmq_output = ZMQOutput()
+        self.start_time_ns = time.monotonic_ns()
+
+        # Recording played back instead of the device
+        self.replay: TraceReplay | None = None
+        self.connected = True
+        self.log = logging.getLogger("eros trace")
+
+        self.decoder = TraceDecoder(learn_schema=self.config.learn_csv_schema)
+
+        # Decode the packets off the GUI thread, every output sink gets the batches on its own worker
+        self.outputs = OutputDispatcher()
+        self.decode_worker = TraceDecodeWorker(self.decoder)
+        self.decode_worker.batch_callbacks.append(self.outputs.write_batch)
+
+        # Samples shared by all the graphs
+        self.store = TraceStore(self.config.max_point_history, self.start_time_ns)
+
+        # Full session history on disk, written by its own output sink worker
+        self.history_store = None
+        if self.config.history_path != "":
+            self.history_store = TraceHistoryStore(self.config.history_path, self.start_time_ns)
+            self.outputs.add(self.history_store)
+
+        # Write out and close every sink, the history included, before the process exits
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.outputs.close)
+
+        # Redraws all the graphs from a single timer
+        self.render_scheduler = RenderScheduler(self, frame_budget_ms=self.config.render_budget_ms)
+
+        # Rolling statistics per key, kept up to date by the decode thread
+        self.stats = None
+        if self.config.stats_window > 0:
+            self.stats = TraceStats(self.config.stats_window)
+            self.decode_worker.batch_callbacks.append(self.stats.update)
+
+        # Latest value per key, waiting for the next table refresh
+        self.pending_values = {}
 
         self.ui = Ui_Form()
         self.ui.setupUi(self.main_widget)
 
         # Configure the table
+        self.table_model = TraceTableModel(self, show_stats=self.stats is not None)
+        self.ui.data_viewer.setModel(self.table_model)
         self.ui.data_viewer.setAlternatingRowColors(True)
         self.ui.data_viewer.setWordWrap(True)
-        self.ui.data_viewer.setSelectionMode(QTreeWidget.SelectionMode.ExtendedSelection)
+        self.ui.data_viewer.setSelectionMode(QTreeView.SelectionMode.ExtendedSelection)
+        self.ui.data_viewer.setSelectionBehavior(QTreeView.SelectionBehavior.SelectRows)
 
-        # Set the headers
-        self.ui.data_viewer.setHeaderLabels(["Key", "Value"])
         self.ui.logger_btn.clicked.connect(self.toggle_csv_logging)
         self.ui.udp_btn.clicked.connect(self.toggle_udp_output)
+        self.ui.zmq_btn.clicked.connect(self.toggle_zmq_output)
+        self.ui.record_btn.clicked.connect(self.toggle_recording)
         self.ui.plotter_btn.clicked.connect(self.create_plotter)
-        self.ui.clear_btn.clicked.connect(lambda: self.ui.data_viewer.clear())
+        self.ui.spectrum_btn.clicked.connect(self.create_spectrum)
+        self.ui.clear_btn.clicked.connect(self.table_model.clear)
+        self.ui.replay_btn.clicked.connect(self.toggle_replay)
+        self.ui.replay_pause_btn.clicked.connect(self.toggle_replay_pause)
+        self.ui.replay_speed.currentIndexChanged.connect(self.set_replay_speed)
+        self.ui.replay_slider.sliderMoved.connect(self.seek_replay)
 
         # Set central widget
         self.setWidget(self.main_widget)
-        self.data_signal.connect(self.update_table)
 
         # start update timer
-        self.update_timer = QTimer(singleShot=False, interval=100)  # type: ignore
+        self.update_timer = QTimer(singleShot=False, interval=int(1000 / self.config.table_update_rate))  # type: ignore
         self.update_timer.timeout.connect(self.update_ui)
         self.update_timer.start()
 
+        # start frame timer, collects the decoded batches
+        self.frame_timer = QTimer(singleShot=False, interval=self.FRAME_INTERVAL_MS)  # type: ignore
+        self.frame_timer.timeout.connect(self.process_frame)
+        self.frame_timer.start()
+
         self.load_config()
 
         if self.config.udp_auto_start:
             self.toggle_udp_output()
 
-    def update_table(self, text_raw: bytes):
-        """Append text to the output text box"""
-        text = text_raw.decode("utf-8")
-        if text[0] == "{":
-            obj = json.loads(text)
-        else:
-            # Load csv
-            obj = {}
-            for i, key in enumerate(text.split(",")):
-                obj[f"item {i}"] = key
+    def process_frame(self):
+        """Move everything decoded since the last frame into the store and the widgets"""
+        batch = self.decode_worker.take()
 
-        if self.csv_output.is_open():
-            self.csv_output.write(obj)
+        if len(batch) == 0:
+            return
+
+        self.store.append_batch(batch)
 
-        if self.udp_output.is_open():
-            self.udp_output.write(obj)
+        graphs = [graph for graph in self.graphs if graph.isOpen()]
+        spectra = [spectrum for spectrum in self.spectra if spectrum.isOpen()]
+        if len(graphs) != len(self.graphs) or len(spectra) != len(self.spectra):
+            # Free the rings of the keys that are not plotted anymore
+            self.store.retain(key for dock in [*graphs, *spectra] for key in dock.series)
+        self.graphs = graphs
+        self.spectra = spectra
 
+        # The graphs split the render share, each adapts its update rate to its own cost
+        render_share = self.config.render_share / 100 / max(len(self.graphs), 1)
         for graph in self.graphs:
-            # Add time index
-            _obj = obj.copy()
-            _obj["time"] = time.time() - self.start_time
-            if not graph.isOpen():
-                self.graphs.remove(graph)
-                break
+            graph.render_share = render_share
+            graph.on_new_data()
 
-            graph.update(_obj)
+        for spectrum in self.spectra:
+            spectrum.mark_dirty()
 
-        # Limit update rate for the graphical portion
-        if time.time() - self.last_update < 0.05:
-            return
+        # The table only shows the latest value, it is refreshed by the update timer
+        self.pending_values.update(batch.latest())
 
-        self.last_update = time.time()
+    def update_table(self):
+        """Show the latest received values in the table"""
+        added = False
 
-        for key, value in obj.items():
-            # find the item in the list
-            items = self.ui.data_viewer.findItems(key, Qt.MatchFlag.MatchExactly)
+        if len(self.pending_values) > 0:
+            pending_values, self.pending_values = self.pending_values, {}
+            added = self.table_model.update(pending_values)
 
-            if len(items) == 0:
-                # Add item to the list
-                item = QTreeWidgetItem(self.ui.data_viewer)
-                item.setText(0, key)
-                item.setText(1, str(value))
-                self.ui.data_viewer.addTopLevelItem(item)
-                # Resize the columns
-                self.ui.data_viewer.resizeColumnToContents(0)
+        if self.stats is not None:
+            added = self.table_model.update_stats(self.stats.snapshot()) or added
 
-            else:
-                # Update the item
-                item = items[0]
-                item.setText(1, str(value))
+        if added:
+            # Resize the columns
+            self.ui.data_viewer.resizeColumnToContents(0)
 
     def toggle_csv_logging(self):
-        if not self.csv_output.is_open():
-            self.csv_output.open(self.config.csv_path, skip_every_n_lines=0)
+        if self.csv_output not in self.outputs:
+            self.csv_output.open(
+                self.config.csv_path,
+                skip_every_n_lines=0,
+                rotate_bytes=int(self.config.csv_rotate_size_mb * 1e6),
+                rotate_seconds=self.config.csv_rotate_minutes * 60,
+            )
+            self.outputs.add(self.csv_output)
         else:
-            self.csv_output.close()
+            self.outputs.remove(self.csv_output)
+
+    def toggle_recording(self):
+        if self.npz_output not in self.outputs:
+            self.npz_output.open(self.config.csv_path)
+            self.outputs.add(self.npz_output)
+        else:
+            self.outputs.remove(self.npz_output)
+        self.update_ui()
 
     def toggle_udp_output(self):
-        if not self.udp_output.is_open():
-            self.udp_output.open(self.config.udp_ip, self.config.udp_port)
+        if self.udp_output not in self.outputs:
+            self.udp_output.open(
+                self.config.udp_ip,
+                self.config.udp_port,
+                encoding=self.config.udp_encoding,
+                mtu=self.config.udp_mtu,
+                flush_interval=self.config.udp_flush_ms / 1000,
+                overflow=self.config.udp_overflow,
+            )
+            self.outputs.add(self.udp_output)
+        else:
+            self.outputs.remove(self.udp_output)
+        self.update_ui()
+
+    def toggle_zmq_output(self):
+        if self.zmq_output not in self.outputs:
+            try:
+                self.zmq_output.open(self.config.zmq_address, self.config.zmq_group_separator)
+            except ZMQError:
+                self.log.exception("Failed to publish on %s", self.config.zmq_address)
+                return
+            self.outputs.add(self.zmq_output)
+        else:
+            self.outputs.remove(self.zmq_output)
+        self.update_ui()
+
+    def toggle_replay(self):
+        if self.replay is not None:
+            self.stop_replay()
+        else:
+            path, _ = QFileDialog.getOpenFileName(
+                self, "Replay trace", self.config.csv_path, "Trace recordings (*.trace *.csv)"
+            )
+            if path == "":
+                return
+
+            try:
+                self.replay = TraceReplay(path, self.config.trace_channel, self.replay_speed())
+            except Exception:
+                self.log.exception("Failed to load %s", path)
+                return
+            # The recording gets its own decoder, the layouts learned from the device are kept
+            decoder = TraceDecoder(learn_schema=self.config.learn_csv_schema)
+            self.replay.attach_channel_callback(
+                self.config.trace_channel, functools.partial(self.decode_worker.put, decoder=decoder)
+            )
+
+        self.update_enabled()
+        self.update_ui()
+
+    def stop_replay(self):
+        assert self.replay is not None
+        self.replay.stop()
+        self.replay = None
+
+    def replay_speed(self) -> float:
+        return self.REPLAY_SPEEDS[self.ui.replay_speed.currentIndex()]
+
+    def toggle_replay_pause(self):
+        if self.replay is None:
+            return
+
+        if self.replay.paused:
+            self.replay.resume()
         else:
-            self.udp_output.close()
+            self.replay.pause()
         self.update_ui()
 
+    def set_replay_speed(self):
+        if self.replay is not None:
+            self.replay.set_speed(self.replay_speed())
+
+    def seek_replay(self, position: int):
+        if self.replay is not None:
+            self.replay.seek(position / self.ui.replay_slider.maximum() * self.replay.duration)
+
+    def receive_live(self, packet: bytes):
+        # The device is ignored while a recording is replayed, the two would mix otherwise. Its
+        # binary descriptor is still learned, the device sends that only once
+        if self.replay is None or packet[:1] == bytes([BINARY_DESCRIPTOR]):
+            self.decode_worker.put(packet)
+
     def create_plotter(self):
-        selected_items = self.ui.data_viewer.selectedItems()
+        selected_rows = self.ui.data_viewer.selectionModel().selectedRows(0)
 
-        if len(selected_items) == 0:
+        if len(selected_rows) == 0:
             return
 
         next_id = 1
@@ -153,68 +307,201 @@ class QErosTraceWidget(QDockWidget):
 
         dockable_widget = QGraphWidget(
             id=next_id,
-            columns=[item.text(0) for item in selected_items],
+            columns=[self.table_model.key(index.row()) for index in selected_rows],
+            store=self.store,
             index="time",
             max_points=self.config.max_point_history,
             max_update_rate=self.config.max_update_rate,
+            decimation=self.config.decimation,
+            scroll_window=self.config.scroll_window,
+            history=self.history_store,
         )
 
+        self.add_graph(dockable_widget)
+
+    def add_graph(self, dockable_widget: QGraphWidget):
         self.parent().addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, dockable_widget)  # type: ignore
 
         self.graphs.append(dockable_widget)
+        self.render_scheduler.add(dockable_widget)
+
+        # Draw what is already in the store
+        dockable_widget.mark_dirty()
+
+    def create_spectrum(self):
+        selected_rows = self.ui.data_viewer.selectionModel().selectedRows(0)
+
+        if len(selected_rows) == 0:
+            return
+
+        next_id = 1
+        if len(self.spectra) > 0:
+            next_id = max([spectrum.id for spectrum in self.spectra]) + 1
+
+        dockable_widget = QSpectrumWidget(
+            id=next_id,
+            columns=[self.table_model.key(index.row()) for index in selected_rows],
+            store=self.store,
+            fft_size=self.config.fft_size,
+            averages=self.config.fft_averages,
+        )
+
+        self.add_spectrum(dockable_widget)
+
+    def add_spectrum(self, dockable_widget: QSpectrumWidget):
+        self.parent().addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, dockable_widget)  # type: ignore
+
+        self.spectra.append(dockable_widget)
+        self.render_scheduler.add(dockable_widget)
 
     def update_ui(self):
+        self.update_table()
+
         status_string = ""
-        if self.udp_output.is_open():
+        if self.udp_output in self.outputs:
             self.ui.udp_btn.setText("Stop UDP")
-            status_string += f"UDP Packets: {self.udp_output.get_logged_packets()}\n"
+            status_string += (
+                f"UDP Packets: {self.udp_output.get_logged_packets()}, "
+                f"datagrams: {self.udp_output.get_sent_datagrams()}, "
+                f"unsent: {self.udp_output.get_dropped_datagrams()}, {self.output_status(self.udp_output)}\n"
+            )
         else:
             self.ui.udp_btn.setText("Start UDP")
 
-        if self.csv_output.is_open():
+        if self.zmq_output in self.outputs:
+            self.ui.zmq_btn.setText("Stop ZMQ")
+            status_string += (
+                f"ZMQ samples: {self.zmq_output.get_sent_samples()}, "
+                f"messages: {self.zmq_output.get_sent_messages()}, {self.output_status(self.zmq_output)}\n"
+            )
+        else:
+            self.ui.zmq_btn.setText("Start ZMQ")
+
+        if self.csv_output in self.outputs:
             self.ui.logger_btn.setText("Stop Logging")
-            status_string += f"CSV Packets: {self.csv_output.get_logged_packets()}\n"
+            status_string += (
+                f"CSV Packets: {self.csv_output.get_logged_packets()}, {self.output_status(self.csv_output)}\n"
+            )
         else:
             self.ui.logger_btn.setText("Start Logging")
 
+        if self.npz_output in self.outputs:
+            self.ui.record_btn.setText("Stop recording")
+            status_string += (
+                f"Recorded samples: {self.npz_output.get_logged_samples()}, {self.output_status(self.npz_output)}\n"
+            )
+        else:
+            self.ui.record_btn.setText("Start recording")
+
+        # The history and sinks added from outside the widget
+        for sink in self.outputs.sinks:
+            if sink not in (self.udp_output, self.zmq_output, self.csv_output, self.npz_output):
+                status_string += f"{sink.name}: {self.output_status(sink)}\n"
+
+        status_string += f"Plot memory: {self.store.nbytes / 1e6:.0f} MB for {len(self.store.series)} plotted keys"
+
         self.ui.label.setText(status_string)
+        self.update_replay_controls()
+
+    def output_status(self, sink: OutputSink) -> str:
+        stats = self.outputs.stats(sink)
+        status = f"queued: {stats.queued} samples, dropped: {stats.dropped} samples"
+        if stats.errors > 0:
+            status += f", errors: {stats.errors}"
+        return status
+
+    def update_replay_controls(self):
+        if self.replay is not None and self.replay.finished:
+            # Hand the table back to the device once the recording has played out
+            self.stop_replay()
+            self.update_enabled()
+
+        replay = self.replay
+        self.ui.replay_btn.setText("Stop replay" if replay is not None else "Replay file")
+        self.ui.replay_pause_btn.setEnabled(replay is not None)
+        self.ui.replay_slider.setEnabled(replay is not None)
+
+        if replay is None:
+            self.ui.replay_pause_btn.setText("Pause")
+            self.ui.replay_label.setText("")
+            return
+
+        self.ui.replay_pause_btn.setText("Play" if replay.paused else "Pause")
+
+        current = replay.current_time()
+        if not self.ui.replay_slider.isSliderDown() and replay.duration > 0:
+            self.ui.replay_slider.setValue(int(current / replay.duration * self.ui.replay_slider.maximum()))
+        self.ui.replay_label.setText(f"{current:.1f} / {replay.duration:.1f} s, live data paused")
 
     def set_eros_handle(self, eros: Eros):
         self.eros_handle = eros
-        self.eros_handle.attach_channel_callback(self.config.trace_channel, self.data_signal.emit)
+        self.eros_handle.attach_channel_callback(self.config.trace_channel, self.receive_live)
 
     def status_update_callback(self, status: TransportStates):
-        if status == TransportStates.CONNECTED:
-            self.main_widget.setEnabled(True)
-        else:
-            self.main_widget.setEnabled(False)
+        self.connected = status == TransportStates.CONNECTED
+        self.update_enabled()
+
+    def update_enabled(self):
+        # The replay controls stay usable without a device
+        enabled = self.connected or self.replay is not None
+        for widget in [self.ui.frame, self.ui.label, self.ui.data_viewer, self.ui.clear_btn]:
+            widget.setEnabled(enabled)
 
     def save_config(self):
         # Save the state of all the dockable widgets
         widget_config = [param.to_dict() for param in self.graphs]
         self.settings.setValue("graph_widgets", widget_config)
 
+        spectrum_config = [spectrum.to_dict() for spectrum in self.spectra]
+        self.settings.setValue("spectrum_widgets", spectrum_config)
+
     def load_config(self):
         widgets = self.settings.value("graph_widgets", [])
         assert isinstance(widgets, list)
 
         for widget_config in widgets:
-            dockable_widget = QGraphWidget.from_dict(widget_config)
+            dockable_widget = QGraphWidget.from_dict(widget_config, self.store, self.history_store)
             if dockable_widget is None:
                 continue
-            self.parent().addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, dockable_widget)  # type: ignore
-            self.graphs.append(dockable_widget)
+            self.add_graph(dockable_widget)
+
+        spectra = self.settings.value("spectrum_widgets", [])
+        assert isinstance(spectra, list)
+
+        for spectrum_config in spectra:
+            spectrum = QSpectrumWidget.from_dict(spectrum_config, self.store)
+            if spectrum is None:
+                continue
+            self.add_spectrum(spectrum)
 
 
 class QErosTraceConfigWidget(QGenericSettingsWidget):
     class Model(BaseModel):
         udp_ip: str = "127.0.0.1"
         udp_port: int = 1234
+        udp_encoding: str = UDP_JSON
+        udp_mtu: int = 1400
+        udp_flush_ms: float = 10
+        udp_overflow: str = OVERFLOW_DROP_OLDEST
+        zmq_address: str = "tcp://127.0.0.1:5560"
+        zmq_group_separator: str = "."
         csv_path: str = os.path.expanduser("~/Desktop/")
+        csv_rotate_size_mb: float = 0
+        csv_rotate_minutes: float = 0
+        history_path: str = ""
         trace_channel: int = 10
         max_point_history: int = 5000
         max_update_rate: float = 15
+        render_budget_ms: float = 15
+        render_share: float = 30
+        decimation: str = "minmax"
+        scroll_window: float = 0
+        fft_size: int = 1024
+        fft_averages: int = 8
+        table_update_rate: float = 10
+        stats_window: int = 0
         udp_auto_start: bool = False
+        learn_csv_schema: bool = True
 
     def __init__(self) -> None:
         super().__init__()
@@ -229,8 +516,32 @@ class QErosTraceConfigWidget(QGenericSettingsWidget):
         self.udp_port_input.setMinimum(0)
         self.udp_port_input.setMaximum(65535)
 
+        self.udp_encoding_input = QComboBox()
+        self.udp_encoding_input.addItems(UDP_ENCODINGS)
+
+        self.udp_mtu_input = QSpinBox()
+        self.udp_mtu_input.setMinimum(64)
+        self.udp_mtu_input.setMaximum(65_000)
+        self.udp_mtu_input.setSuffix(" bytes")
+
+        self.udp_flush_input = QDoubleSpinBox()
+        self.udp_flush_input.setMinimum(0)
+        self.udp_flush_input.setMaximum(1000)
+        self.udp_flush_input.setSuffix(" ms")
+
+        self.udp_overflow_input = QComboBox()
+        self.udp_overflow_input.addItems(OVERFLOW_POLICIES)
+
         self.udp_auto_start_input = QCheckBox("Auto start")
 
+        self.zmq_address_input = QLineEdit()
+
+        # Empty puts every key in a topic of its own
+        self.zmq_group_separator_input = QLineEdit()
+        self.zmq_group_separator_input.setMaxLength(1)
+
+        self.learn_csv_schema_input = QCheckBox("Learn CSV layout (fast parsing)")
+
         self.csv_path_input = QLineEdit()
 
         select_folder_action = QAction(self)
@@ -238,43 +549,147 @@ class QErosTraceConfigWidget(QGenericSettingsWidget):
         select_folder_action.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirOpenIcon))
         self.csv_path_input.addAction(select_folder_action, QLineEdit.ActionPosition.TrailingPosition)
 
+        self.csv_rotate_size_input = QDoubleSpinBox()
+        self.csv_rotate_size_input.setMinimum(0)
+        self.csv_rotate_size_input.setMaximum(100_000)
+        self.csv_rotate_size_input.setSuffix(" MB")
+        self.csv_rotate_size_input.setSpecialValueText("Off")
+
+        self.csv_rotate_minutes_input = QDoubleSpinBox()
+        self.csv_rotate_minutes_input.setMinimum(0)
+        self.csv_rotate_minutes_input.setMaximum(10_000)
+        self.csv_rotate_minutes_input.setSuffix(" min")
+        self.csv_rotate_minutes_input.setSpecialValueText("Off")
+
+        # Empty disables the on-disk history
+        self.history_path_input = QLineEdit()
+        self.history_path_input.setPlaceholderText("Disabled")
+
+        select_history_folder_action = QAction(self)
+        select_history_folder_action.triggered.connect(self.query_history_folder)
+        select_history_folder_action.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirOpenIcon))
+        self.history_path_input.addAction(select_history_folder_action, QLineEdit.ActionPosition.TrailingPosition)
+
         self.max_point_history_input = QSpinBox()
-        self.max_point_history_input.setMinimum(0)
-        self.max_point_history_input.setMaximum(10000)
+        self.max_point_history_input.setMinimum(1)
+        self.max_point_history_input.setMaximum(1_000_000)
+        self.max_point_history_input.setSingleStep(1000)
+        self.max_point_history_input.setToolTip(
+            "Points kept in memory for every plotted key.\n"
+            "Each key takes about 18 bytes per point: 90 MB for 5 keys at 1,000,000 points.\n"
+            "Use the history path for long recordings instead."
+        )
 
         self.max_update_rate_input = QDoubleSpinBox()
         self.max_update_rate_input.setMinimum(0.1)
         self.max_update_rate_input.setMaximum(20)
 
+        self.render_budget_input = QDoubleSpinBox()
+        self.render_budget_input.setMinimum(1)
+        self.render_budget_input.setMaximum(100)
+        self.render_budget_input.setSuffix(" ms")
+
+        self.render_share_input = QDoubleSpinBox()
+        self.render_share_input.setMinimum(5)
+        self.render_share_input.setMaximum(90)
+        self.render_share_input.setSuffix(" %")
+
+        self.scroll_window_input = QDoubleSpinBox()
+        self.scroll_window_input.setMinimum(0)
+        self.scroll_window_input.setMaximum(3600)
+        self.scroll_window_input.setSuffix(" s")
+        self.scroll_window_input.setSpecialValueText("Off")
+
+        self.decimation_input = QComboBox()
+        self.decimation_input.addItems(DECIMATION_MODES)
+
+        self.fft_size_input = QComboBox()
+        self.fft_size_input.addItems([str(2**i) for i in range(8, 17)])
+
+        self.fft_averages_input = QSpinBox()
+        self.fft_averages_input.setMinimum(1)
+        self.fft_averages_input.setMaximum(256)
+
+        self.table_update_rate_input = QDoubleSpinBox()
+        self.table_update_rate_input.setMinimum(0.1)
+        self.table_update_rate_input.setMaximum(30)
+
+        self.stats_window_input = QSpinBox()
+        self.stats_window_input.setMinimum(0)
+        self.stats_window_input.setMaximum(1_000_000)
+        self.stats_window_input.setSingleStep(100)
+        self.stats_window_input.setSuffix(" samples")
+        self.stats_window_input.setSpecialValueText("Off")
+
         font = QFont()
         font.setUnderline(True)
 
         # Set the layout
         self._layout = QFormLayout()
         self._layout.addRow("Trace Channel", self.trace_channel_input)
+        self._layout.addWidget(self.learn_csv_schema_input)
+        self._layout.addRow("Table update rate", self.table_update_rate_input)
+        self._layout.addRow("Statistics window", self.stats_window_input)
         # Add a label on the first column, which contains underlined text "UDP Settings"
 
         self._layout.addRow(QLabel("UDP Settings", font=font))  # type: ignore
         self._layout.addRow("UDP IP", self.udp_ip_input)
         self._layout.addRow("UDP Port", self.udp_port_input)
+        self._layout.addRow("Encoding", self.udp_encoding_input)
+        self._layout.addRow("Datagram size", self.udp_mtu_input)
+        self._layout.addRow("Max batching delay", self.udp_flush_input)
+        self._layout.addRow("When the queue is full", self.udp_overflow_input)
         self._layout.addWidget(self.udp_auto_start_input)
 
+        self._layout.addRow(QLabel("ZMQ Settings", font=font))  # type: ignore
+        self._layout.addRow("Publish address", self.zmq_address_input)
+        self._layout.addRow("Key group separator", self.zmq_group_separator_input)
+
         self._layout.addRow(QLabel("CSV Settings", font=font))  # type: ignore
         self._layout.addRow("Path", self.csv_path_input)
+        self._layout.addRow("Rotate at size", self.csv_rotate_size_input)
+        self._layout.addRow("Rotate after", self.csv_rotate_minutes_input)
 
         self._layout.addRow(QLabel("Plot settings", font=font))  # type: ignore
         self._layout.addRow("Max points", self.max_point_history_input)
+        self._layout.addRow("History path", self.history_path_input)
         self._layout.addRow("Max update rate", self.max_update_rate_input)
+        self._layout.addRow("Scroll window", self.scroll_window_input)
+        self._layout.addRow("Decimation", self.decimation_input)
+        self._layout.addRow("Render budget per frame", self.render_budget_input)
+        self._layout.addRow("Max share of GUI time", self.render_share_input)
+
+        self._layout.addRow(QLabel("Spectrum settings", font=font))  # type: ignore
+        self._layout.addRow("FFT size", self.fft_size_input)
+        self._layout.addRow("Averages", self.fft_averages_input)
 
         self.setLayout(self._layout)
 
         self.udp_ip_input.textChanged.connect(self._on_value_changed)
         self.udp_port_input.valueChanged.connect(self._on_value_changed)
+        self.udp_encoding_input.currentTextChanged.connect(self._on_value_changed)
+        self.udp_mtu_input.valueChanged.connect(self._on_value_changed)
+        self.udp_flush_input.valueChanged.connect(self._on_value_changed)
+        self.udp_overflow_input.currentTextChanged.connect(self._on_value_changed)
+        self.zmq_address_input.textChanged.connect(self._on_value_changed)
+        self.zmq_group_separator_input.textChanged.connect(self._on_value_changed)
         self.csv_path_input.textChanged.connect(self._on_value_changed)
+        self.csv_rotate_size_input.valueChanged.connect(self._on_value_changed)
+        self.csv_rotate_minutes_input.valueChanged.connect(self._on_value_changed)
+        self.history_path_input.textChanged.connect(self._on_value_changed)
         self.trace_channel_input.valueChanged.connect(self._on_value_changed)
         self.max_point_history_input.valueChanged.connect(self._on_value_changed)
         self.max_update_rate_input.valueChanged.connect(self._on_value_changed)
+        self.scroll_window_input.valueChanged.connect(self._on_value_changed)
+        self.decimation_input.currentTextChanged.connect(self._on_value_changed)
+        self.render_budget_input.valueChanged.connect(self._on_value_changed)
+        self.render_share_input.valueChanged.connect(self._on_value_changed)
+        self.fft_size_input.currentTextChanged.connect(self._on_value_changed)
+        self.fft_averages_input.valueChanged.connect(self._on_value_changed)
+        self.table_update_rate_input.valueChanged.connect(self._on_value_changed)
+        self.stats_window_input.valueChanged.connect(self._on_value_changed)
         self.udp_auto_start_input.stateChanged.connect(self._on_value_changed)
+        self.learn_csv_schema_input.stateChanged.connect(self._on_value_changed)
 
     def query_folder(self):
         path = QFileDialog.getExistingDirectory(self, "Select Directory", self.csv_path_input.text())
@@ -284,24 +699,68 @@ class QErosTraceConfigWidget(QGenericSettingsWidget):
 
         self.csv_path_input.setText(path)
 
+    def query_history_folder(self):
+        path = QFileDialog.getExistingDirectory(self, "Select Directory", self.history_path_input.text())
+
+        if path is None or path == "":
+            return
+
+        self.history_path_input.setText(path)
+
     @property
     def data(self) -> Model:
         return QErosTraceConfigWidget.Model(
             udp_ip=self.udp_ip_input.text(),
             udp_port=self.udp_port_input.value(),
+            udp_encoding=self.udp_encoding_input.currentText(),
+            udp_mtu=self.udp_mtu_input.value(),
+            udp_flush_ms=self.udp_flush_input.value(),
+            udp_overflow=self.udp_overflow_input.currentText(),
+            zmq_address=self.zmq_address_input.text(),
+            zmq_group_separator=self.zmq_group_separator_input.text(),
             csv_path=self.csv_path_input.text(),
+            csv_rotate_size_mb=self.csv_rotate_size_input.value(),
+            csv_rotate_minutes=self.csv_rotate_minutes_input.value(),
+            history_path=self.history_path_input.text(),
             trace_channel=self.trace_channel_input.value(),
             max_point_history=self.max_point_history_input.value(),
             max_update_rate=self.max_update_rate_input.value(),
+            scroll_window=self.scroll_window_input.value(),
+            decimation=self.decimation_input.currentText(),
+            render_budget_ms=self.render_budget_input.value(),
+            render_share=self.render_share_input.value(),
+            fft_size=int(self.fft_size_input.currentText()),
+            fft_averages=self.fft_averages_input.value(),
+            table_update_rate=self.table_update_rate_input.value(),
+            stats_window=self.stats_window_input.value(),
             udp_auto_start=self.udp_auto_start_input.isChecked(),
+            learn_csv_schema=self.learn_csv_schema_input.isChecked(),
         )
 
     @data.setter
     def data(self, config: Model):
         self.udp_ip_input.setText(config.udp_ip)
         self.udp_port_input.setValue(config.udp_port)
+        self.udp_encoding_input.setCurrentText(config.udp_encoding)
+        self.udp_mtu_input.setValue(config.udp_mtu)
+        self.udp_flush_input.setValue(config.udp_flush_ms)
+        self.udp_overflow_input.setCurrentText(config.udp_overflow)
+        self.zmq_address_input.setText(config.zmq_address)
+        self.zmq_group_separator_input.setText(config.zmq_group_separator)
         self.csv_path_input.setText(config.csv_path)
+        self.csv_rotate_size_input.setValue(config.csv_rotate_size_mb)
+        self.csv_rotate_minutes_input.setValue(config.csv_rotate_minutes)
+        self.history_path_input.setText(config.history_path)
         self.trace_channel_input.setValue(config.trace_channel)
         self.max_point_history_input.setValue(config.max_point_history)
         self.max_update_rate_input.setValue(config.max_update_rate)
+        self.scroll_window_input.setValue(config.scroll_window)
+        self.decimation_input.setCurrentText(config.decimation)
+        self.render_budget_input.setValue(config.render_budget_ms)
+        self.render_share_input.setValue(config.render_share)
+        self.fft_size_input.setCurrentText(str(config.fft_size))
+        self.fft_averages_input.setValue(config.fft_averages)
+        self.table_update_rate_input.setValue(config.table_update_rate)
+        self.stats_window_input.setValue(config.stats_window)
         self.udp_auto_start_input.setChecked(config.udp_auto_start)
+        self.learn_csv_schema_input.setChecked(config.learn_csv_schema)
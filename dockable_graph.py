@@ -1,88 +1,402 @@
-import collections
 import logging
 import time
 from typing import Dict, List
 
-import pandas as pd
+import numpy as np
 import pyqtgraph as pg
-from qtpy.QtWidgets import QDockWidget
+from qtpy.QtCore import Qt
+from qtpy.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QDockWidget,
+    QDoubleSpinBox,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSpinBox,
+    QVBoxLayout,
+    QWidget,
+)
+
+from .decimation import DECIMATION_MINMAX, decimate
+from .trace_history import TraceHistoryStore
+from .trace_store import TraceSeries, TraceStore
+from .trace_trigger import TRIGGER_MODES, TRIGGER_OFF, TraceTrigger
+
+
+def _drop_missing(x: np.ndarray, y: np.ndarray):
+    """Leave out the samples a key is missing from, so the line connects the received ones"""
+    valid = ~np.isnan(y)
+    if valid.all():
+        return x, y
+    return x[valid], y[valid]
+
+
+def _detached(array: np.ndarray) -> np.ndarray:
+    """Copy of a view, pyqtgraph keeps the arrays it is given and repaints from them later,
+    by then the ring may have overwritten what a view points at"""
+    return array.copy() if array.base is not None else array
+
+
+class _TimedPlotWidget(pg.PlotWidget):
+    """Plot widget that measures how long it takes to paint"""
+
+    paint_time = 0.0
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.paint_time = time.perf_counter() - start
 
 
 class QGraphWidget(QDockWidget):
     PLOT_COLORS = ["r", "g", "b", "c", "m", "y", "k"]
-    time_index = None
-    data: Dict[str, collections.deque]
+    # The adaptive update rate never drops below this
+    MIN_UPDATE_RATE = 0.5
+    series: Dict[str, TraceSeries]
     plots: Dict[str, pg.PlotDataItem]
-    indexes: Dict[str, collections.deque]
 
     def __init__(
         self,
         id: int,
         columns: List[str],
+        store: TraceStore,
         index="time",
         max_points=1000,
         max_update_rate: float = 1,
+        decimation: str = DECIMATION_MINMAX,
+        scroll_window: float = 0,
+        history: TraceHistoryStore | None = None,
+        trigger: dict | None = None,
+        render_share: float = 0.3,
     ):
         super().__init__(f"Graph {id}", objectName=f"graph_dock_{id}")  # type: ignore
         self.id = id
         self.max_update_rate = max_update_rate
-        self.last_update = time.time()
+        # Share of the GUI thread this graph may spend on redrawing, the update rate follows from it
+        self.render_share = render_share
+        self.update_rate = max_update_rate
+        self.render_cost = 0.0
+        self.shown_rate = None
+        self.decimation = decimation
+        # Length of the scrolling time window in seconds, 0 shows the whole history
+        self.scroll_window = scroll_window
+        # Optional on-disk history, used for everything older than the samples in the store
+        self.history = history
+        self.last_update = time.perf_counter()
+
+        # Set when new data is available, the render scheduler then redraws the graph
+        self.dirty = False
+        self.urgent = False
+
+        # Triggered capture, replaces the live view while enabled
+        self.trigger: TraceTrigger | None = None
+        self.new_capture = False
 
         self.log = logging.getLogger(f"graph {id}")
 
         self.plots = {}
-        self.data = {}
-        self.indexes = {}
+        self.series = {}
 
-        self.graphWidget = pg.PlotWidget()
+        self.graphWidget = _TimedPlotWidget()
         self.graphWidget.setBackground("w")
         self.graphWidget.addLegend()
+        self.graphWidget.getViewBox().sigXRangeChanged.connect(self.on_x_range_changed)
+
+        self.trigger_line = pg.InfiniteLine(pos=0, angle=90, pen=pg.mkPen("k", style=Qt.PenStyle.DashLine))
+        self.trigger_line.setVisible(False)
+        self.graphWidget.addItem(self.trigger_line)
+
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self.create_trigger_controls(columns))
+        layout.addWidget(self.graphWidget)
 
-        self.setWidget(self.graphWidget)
-        self.frame = pd.DataFrame(columns=columns)
+        self.setWidget(container)
         self.max_points = max_points
 
-        # Create a circular buffer for the time index
+        # The samples are owned by the shared store, the index is kept for the config
+        self.store = store
         self.index = index
 
         # Create plots for each column
         for i, column in enumerate(columns):
             plot_color = self.PLOT_COLORS[i % len(self.PLOT_COLORS)]
-            self.indexes[column] = collections.deque(maxlen=self.max_points)
-            self.data[column] = collections.deque(maxlen=self.max_points)
+            self.series[column] = store.get(column)
             self.plots[column] = self.graphWidget.plot(pen=plot_color, name=column)
 
-        # Add legend
+        if self.scroll_window > 0:
+            self.enable_scrolling()
 
-    def update(self, data: Dict):
-        if self.graphWidget is None:
+        if trigger is not None:
+            self.load_trigger(trigger)
+
+    def create_trigger_controls(self, columns: List[str]) -> QWidget:
+        controls = QWidget()
+        layout = QHBoxLayout(controls)
+        layout.setContentsMargins(4, 2, 4, 2)
+
+        self.trigger_mode_input = QComboBox()
+        self.trigger_mode_input.addItems(TRIGGER_MODES)
+
+        self.trigger_key_input = QComboBox()
+        self.trigger_key_input.addItems(columns)
+
+        self.trigger_level_input = QDoubleSpinBox()
+        self.trigger_level_input.setRange(-1e9, 1e9)
+        self.trigger_level_input.setDecimals(3)
+
+        self.trigger_pre_input = QSpinBox()
+        self.trigger_pre_input.setRange(0, 1_000_000)
+        self.trigger_pre_input.setPrefix("Pre ")
+        self.trigger_pre_input.setValue(100)
+
+        self.trigger_post_input = QSpinBox()
+        self.trigger_post_input.setRange(1, 1_000_000)
+        self.trigger_post_input.setPrefix("Post ")
+        self.trigger_post_input.setValue(900)
+
+        self.trigger_auto_input = QCheckBox("Auto rearm")
+        self.trigger_auto_input.setChecked(True)
+
+        self.trigger_arm_btn = QPushButton("Arm")
+        self.trigger_status = QLabel()
+
+        layout.addWidget(QLabel("Trigger"))
+        layout.addWidget(self.trigger_mode_input)
+        layout.addWidget(self.trigger_key_input)
+        layout.addWidget(self.trigger_level_input)
+        layout.addWidget(self.trigger_pre_input)
+        layout.addWidget(self.trigger_post_input)
+        layout.addWidget(self.trigger_auto_input)
+        layout.addWidget(self.trigger_arm_btn)
+        layout.addWidget(self.trigger_status)
+        layout.addStretch()
+
+        self.trigger_mode_input.currentTextChanged.connect(self.apply_trigger)
+        self.trigger_key_input.currentTextChanged.connect(self.apply_trigger)
+        self.trigger_level_input.valueChanged.connect(self.apply_trigger)
+        self.trigger_pre_input.valueChanged.connect(self.apply_trigger)
+        self.trigger_post_input.valueChanged.connect(self.apply_trigger)
+        self.trigger_auto_input.stateChanged.connect(self.apply_trigger)
+        self.trigger_arm_btn.clicked.connect(self.arm_trigger)
+
+        return controls
+
+    def trigger_settings(self) -> dict:
+        return {
+            "mode": self.trigger_mode_input.currentText(),
+            "key": self.trigger_key_input.currentText(),
+            "level": self.trigger_level_input.value(),
+            "pre_samples": self.trigger_pre_input.value(),
+            "post_samples": self.trigger_post_input.value(),
+            "auto_rearm": self.trigger_auto_input.isChecked(),
+        }
+
+    def load_trigger(self, settings: dict):
+        self.trigger_mode_input.setCurrentText(settings.get("mode", TRIGGER_OFF))
+        self.trigger_key_input.setCurrentText(settings.get("key", ""))
+        self.trigger_level_input.setValue(settings.get("level", 0))
+        self.trigger_pre_input.setValue(settings.get("pre_samples", 100))
+        self.trigger_post_input.setValue(settings.get("post_samples", 900))
+        self.trigger_auto_input.setChecked(settings.get("auto_rearm", True))
+        self.apply_trigger()
+
+    def apply_trigger(self, *args):
+        settings = self.trigger_settings()
+
+        if settings["mode"] == TRIGGER_OFF or settings["key"] == "":
+            if self.trigger is not None:
+                # Back to the live view
+                self.trigger = None
+                self.trigger_line.setVisible(False)
+                if self.scroll_window <= 0:
+                    self.graphWidget.getViewBox().enableAutoRange(x=True)
+                self.mark_dirty(urgent=True)
+            self.update_trigger_status()
+            return
+
+        self.trigger = TraceTrigger(self.store, columns=list(self.series.keys()), **settings)
+        self.trigger_line.setVisible(True)
+        self.update_trigger_status()
+
+    def arm_trigger(self):
+        if self.trigger is not None:
+            self.trigger.arm()
+            self.update_trigger_status()
+
+    def update_trigger_status(self):
+        text = self.trigger.state if self.trigger is not None else ""
+        if self.trigger_status.text() != text:
+            self.trigger_status.setText(text)
+
+    def on_new_data(self):
+        """Called by the trace widget for every frame with new samples in the store"""
+        if self.trigger is None:
+            self.mark_dirty()
             return
 
-        # Add data to frame
-        for key, value in data.items():
-            if key in self.data:
-                self.data[key].append(float(value))
-                self.indexes[key].appendleft(float(data[self.index]))
+        if self.trigger.process():
+            self.new_capture = True
+            self.mark_dirty(urgent=True)
+        self.update_trigger_status()
 
-        if time.time() - self.last_update < 1 / self.max_update_rate:
+    def enable_scrolling(self):
+        """Oscilloscope mode, pyqtgraph only draws the visible window and downsamples it"""
+        plot_item = self.graphWidget.getPlotItem()
+        plot_item.setClipToView(True)
+        plot_item.setDownsampling(auto=True, mode="peak")
+
+        for plot in self.plots.values():
+            plot.setSkipFiniteCheck(True)
+
+        # The x range follows the data, only the visible samples are used for the y range
+        view_box = self.graphWidget.getViewBox()
+        view_box.enableAutoRange(x=False)
+        view_box.setAutoVisible(y=True)
+
+    def mark_dirty(self, urgent: bool = False):
+        """Request a redraw, urgent requests skip the update rate limit"""
+        self.dirty = True
+        self.urgent = self.urgent or urgent
+
+    def needs_render(self, now: float) -> bool:
+        return self.dirty and (self.urgent or now - self.last_update >= 1 / self.update_rate)
+
+    def refresh(self, force: bool = False):
+        if self.graphWidget is None:
+            return
+
+        if not force and time.perf_counter() - self.last_update < 1 / self.update_rate:
             return
 
-        self.last_update = time.time()
+        self.last_update = time.perf_counter()
+        self.dirty = False
+        self.urgent = False
+
+        if self.trigger is not None:
+            self.refresh_triggered()
+        elif self.scroll_window > 0:
+            self.refresh_scrolling()
+        else:
+            self.refresh_live()
+
+        # The paint of the previous refresh is the best estimate for the coming one
+        self.adapt_update_rate(time.perf_counter() - self.last_update + self.graphWidget.paint_time)
+
+    def adapt_update_rate(self, cost: float):
+        """Lower the update rate when redrawing is expensive, up to max_update_rate when it's cheap"""
+        self.render_cost = cost if self.render_cost == 0 else 0.8 * self.render_cost + 0.2 * cost
+
+        rate = self.render_share / self.render_cost if self.render_cost > 0 else self.max_update_rate
+        rate = min(max(rate, self.MIN_UPDATE_RATE), self.max_update_rate)
+
+        self.update_rate = rate
+
+        # Only touch the title when the shown value changes
+        shown_rate = round(rate, 1)
+        if shown_rate != self.shown_rate:
+            self.shown_rate = shown_rate
+            self.setWindowTitle(f"Graph {self.id} ({shown_rate:.1f} Hz)")
+
+    def refresh_live(self):
+        # About two points per pixel is all that can be shown
+        view_box = self.graphWidget.getViewBox()
+        points = 2 * max(int(view_box.width()), 100)
+
+        # When zoomed in only the visible part is decimated, to keep the detail
+        x_range = None if view_box.autoRangeEnabled()[0] else view_box.viewRange()[0]
+
+        # The time axis is shared by all the columns, so it is only sliced once
+        x_all = self.store.time.values(self.max_points)
+        if len(x_all) == 0:
+            return
+        first, last = 0, len(x_all)
+        if x_range is not None:
+            # Keep one point outside the view on each side, so the lines reach the edges
+            first = max(int(np.searchsorted(x_all, x_range[0])) - 1, 0)
+            last = int(np.searchsorted(x_all, x_range[1])) + 1
 
         # Update plots
-        for column in self.data.keys():
-            if len(self.data[column]) == 0:
-                continue
+        for column, series in self.series.items():
+            history_x, history_y = self.query_history(column, x_all[0], x_range, points)
+
+            # Views into the store, only the decimated points are copied for the plot
+            x, y = _drop_missing(x_all[first:last], series.value.values(self.max_points)[first:last])
+            x, y = decimate(x, y, points, self.decimation)
+
+            if len(history_x) > 0:
+                x = np.concatenate((history_x, x))
+                y = np.concatenate((history_y, y))
+
+            self.plots[column].setData(_detached(x), _detached(y))
+
+    def query_history(self, column: str, oldest: float, x_range, points: int):
+        """Samples older than the store from the on-disk history, at the detail that fits the view"""
+        history = self.history.get(column) if self.history is not None else None
+        if history is None:
+            return (), ()
+
+        # Without zoom the whole session is shown
+        start = history.start_time() if x_range is None else x_range[0]
+        stop = oldest if x_range is None else min(x_range[1], oldest)
+        if start is None or start >= stop:
+            return (), ()
+
+        x, y = history.query(start, stop, points)
+        older = x < oldest
+        return x[older], y[older]
+
+    def refresh_scrolling(self):
+        x = self.store.time.values(self.max_points)
+        if len(x) == 0:
+            return
+        latest = x[-1]
+        window_start = latest - self.scroll_window
+        start = int(np.searchsorted(x, window_start))
+
+        # The finite check is skipped in this mode, so the missing samples have to be dropped
+        for column, series in self.series.items():
+            x_column, y_column = _drop_missing(x[start:], series.value.values(self.max_points)[start:])
+            self.plots[column].setData(_detached(x_column), _detached(y_column))
+
+        self.graphWidget.getViewBox().setXRange(window_start, latest, padding=0)
+
+    def refresh_triggered(self):
+        # The capture only changes when a new one is taken, the view is left alone until then
+        if not self.new_capture or self.trigger.capture is None:
+            return
+        self.new_capture = False
+
+        x, values = self.trigger.capture
+        if len(x) == 0:
+            return
+
+        points = 2 * max(int(self.graphWidget.getViewBox().width()), 100)
+        for column, y in values.items():
+            self.plots[column].setData(*decimate(*_drop_missing(x, y), points, self.decimation))
+
+        self.graphWidget.getViewBox().setXRange(x[0], x[-1], padding=0)
 
-            self.plots[column].setData(list(self.indexes[column]), list(self.data[column]))
+    def on_x_range_changed(self, *args):
+        # Zooming or panning changes what has to be decimated, the scrolling window sets its own range
+        if (
+            self.graphWidget is not None
+            and self.scroll_window <= 0
+            and self.trigger is None
+            and not self.graphWidget.getViewBox().autoRangeEnabled()[0]
+        ):
+            self.mark_dirty(urgent=True)
 
     # If closed destroy the widget
     def closeEvent(self, event):
         self.deleteLater()
         self.graphWidget = None
+        self.trigger = None
         self.plots = None  # type: ignore
-        self.data = None  # type: ignore
-        self.time_index = None
+        self.series = None  # type: ignore
         event.accept()
 
     # Check if the widget is open
@@ -93,22 +407,30 @@ class QGraphWidget(QDockWidget):
         # Return config as a dict
         config = {}
         config["id"] = self.id
-        config["columns"] = list(self.data.keys())
+        config["columns"] = list(self.series.keys())
         config["index"] = self.index
         config["max_points"] = self.max_points
         config["max_update_rate"] = self.max_update_rate
+        config["decimation"] = self.decimation
+        config["scroll_window"] = self.scroll_window
+        config["trigger"] = self.trigger_settings()
         return config
 
     @classmethod
-    def from_dict(cls, config: dict):
+    def from_dict(cls, config: dict, store: TraceStore, history: TraceHistoryStore | None = None):
         try:
             # Load config from dict
             return QGraphWidget(
                 id=config["id"],
                 columns=config["columns"],
+                store=store,
                 index=config["index"],
                 max_points=config["max_points"],
                 max_update_rate=config["max_update_rate"],
+                decimation=config.get("decimation", DECIMATION_MINMAX),
+                scroll_window=config.get("scroll_window", 0),
+                history=history,
+                trigger=config.get("trigger"),
             )
         except Exception:
             log = logging.getLogger("QGraphWidget")
@@ -0,0 +1,192 @@
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List
+
+import numpy as np
+import pyqtgraph as pg
+from numpy.lib.stride_tricks import sliding_window_view
+from qtpy.QtWidgets import QDockWidget
+
+from .trace_store import TraceSeries, TraceStore
+
+
+class QSpectrumWidget(QDockWidget):
+    """Amplitude spectrum of trace keys, averaged over the latest windowed FFT frames.
+
+    Frames of `fft_size` samples start every `hop` samples (half overlapping by default).
+    Only the frames completed since the previous refresh are transformed, their power
+    spectra are averaged with the previous `averages - 1` frames.
+    """
+
+    PLOT_COLORS = ["r", "g", "b", "c", "m", "y", "k"]
+    series: Dict[str, TraceSeries]
+    plots: Dict[str, pg.PlotDataItem]
+    spectra: Dict[str, Deque[np.ndarray]]
+    sample_periods: Dict[str, float]
+
+    def __init__(
+        self,
+        id: int,
+        columns: List[str],
+        store: TraceStore,
+        fft_size: int = 1024,
+        averages: int = 8,
+        max_update_rate: float = 5,
+    ):
+        super().__init__(f"Spectrum {id}", objectName=f"spectrum_dock_{id}")  # type: ignore
+        self.id = id
+        self.store = store
+        self.log = logging.getLogger(f"spectrum {id}")
+
+        # A frame can not be longer than the history the store keeps
+        if fft_size > store.capacity:
+            clamped = 1 << (store.capacity.bit_length() - 1)
+            self.log.warning("FFT size %d exceeds the %d kept points, using %d", fft_size, store.capacity, clamped)
+            self.setWindowTitle(f"Spectrum {id} (FFT size {clamped}, limited by max points)")
+            fft_size = clamped
+
+        self.fft_size = fft_size
+        self.averages = max(1, averages)
+        self.hop = max(1, fft_size // 2)
+        self.max_update_rate = max_update_rate
+        self.last_update = time.perf_counter()
+
+        # Hann window, scaled so a full scale sine shows its amplitude
+        self.fft_window = np.hanning(fft_size)
+        self.scale = 2 / self.fft_window.sum()
+
+        # Samples of the time axis that have been transformed
+        self.processed = store.time.written
+        self.dirty = False
+
+        self.plots = {}
+        self.series = {}
+        self.spectra = {}
+        self.sample_periods = {}
+
+        self.graphWidget = pg.PlotWidget()
+        self.graphWidget.setBackground("w")
+        self.graphWidget.addLegend()
+        self.graphWidget.setLogMode(y=True)
+        self.graphWidget.setLabel("bottom", "Frequency", units="Hz")
+        self.setWidget(self.graphWidget)
+
+        for i, column in enumerate(columns):
+            plot_color = self.PLOT_COLORS[i % len(self.PLOT_COLORS)]
+            self.series[column] = store.get(column)
+            self.spectra[column] = deque(maxlen=self.averages)
+            self.plots[column] = self.graphWidget.plot(pen=plot_color, name=column)
+
+    def mark_dirty(self, urgent: bool = False):
+        self.dirty = True
+
+    def needs_render(self, now: float) -> bool:
+        # Nothing to do until a new hop of samples is available
+        return (
+            self.dirty
+            and self.store.time.written - self.processed >= self.hop
+            and now - self.last_update >= 1 / self.max_update_rate
+        )
+
+    def refresh(self, force: bool = False):
+        if self.graphWidget is None:
+            return
+
+        if not force and time.perf_counter() - self.last_update < 1 / self.max_update_rate:
+            return
+
+        self.last_update = time.perf_counter()
+        self.dirty = False
+
+        time_axis = self.store.time
+        if time_axis.written < self.processed:
+            # The store was cleared
+            self.processed = 0
+            for spectra in self.spectra.values():
+                spectra.clear()
+
+        hops = (time_axis.written - self.processed) // self.hop
+        if hops == 0 or len(time_axis) < self.fft_size:
+            return
+        self.processed += hops * self.hop
+
+        # Older frames would be pushed out of the average anyway
+        frames = min(hops, self.averages)
+        span = self.fft_size + (frames - 1) * self.hop
+
+        for column, series in self.series.items():
+            x = time_axis.values(span)
+            y = series.value.values(span)
+            if np.isnan(y).any():
+                # Sparse key, use its latest received samples
+                y = series.value.values()
+                valid = ~np.isnan(y)
+                x = time_axis.values()[valid][-span:]
+                y = y[valid][-span:]
+
+            if len(y) < self.fft_size:
+                continue
+
+            # Frames ending on the latest sample, the mean is removed so DC doesn't leak
+            available = (len(y) - self.fft_size) // self.hop + 1
+            y = y[len(y) - self.fft_size - (available - 1) * self.hop :]
+            blocks = sliding_window_view(y, self.fft_size)[:: self.hop]
+            blocks = (blocks - blocks.mean(axis=1, keepdims=True)) * self.fft_window
+            power = np.abs(np.fft.rfft(blocks, axis=1)) ** 2
+            self.spectra[column].extend(power)
+            self.sample_periods[column] = self.sample_period(x[-self.fft_size :])
+
+        for column, spectra in self.spectra.items():
+            if len(spectra) == 0:
+                continue
+
+            frequencies = np.fft.rfftfreq(self.fft_size, self.sample_periods[column])
+            amplitude = np.sqrt(np.mean(spectra, axis=0)) * self.scale
+            # The DC bin is empty after removing the mean, and can't be shown on a log axis
+            self.plots[column].setData(frequencies[1:], amplitude[1:])
+
+    @staticmethod
+    def sample_period(x: np.ndarray) -> float:
+        """Median sample spacing, in seconds"""
+        period = float(np.median(np.diff(x))) if len(x) > 1 else 0
+        return period if period > 0 else 1
+
+    # If closed destroy the widget
+    def closeEvent(self, event):
+        self.deleteLater()
+        self.graphWidget = None
+        self.plots = None  # type: ignore
+        self.series = None  # type: ignore
+        event.accept()
+
+    # Check if the widget is open
+    def isOpen(self) -> bool:
+        return self.graphWidget is not None
+
+    def to_dict(self) -> dict:
+        # Return config as a dict
+        config = {}
+        config["id"] = self.id
+        config["columns"] = list(self.series.keys())
+        config["fft_size"] = self.fft_size
+        config["averages"] = self.averages
+        config["max_update_rate"] = self.max_update_rate
+        return config
+
+    @classmethod
+    def from_dict(cls, config: dict, store: TraceStore):
+        try:
+            # Load config from dict
+            return QSpectrumWidget(
+                id=config["id"],
+                columns=config["columns"],
+                store=store,
+                fft_size=config["fft_size"],
+                averages=config["averages"],
+                max_update_rate=config["max_update_rate"],
+            )
+        except Exception:
+            log = logging.getLogger("QSpectrumWidget")
+            log.exception("Failed to load spectrum config")
+            return None
@@ -0,0 +1,77 @@
+import logging
+import time
+from typing import List, Protocol
+
+from qtpy.QtCore import QObject, QTimer
+from qtpy.QtWidgets import QWidget
+
+
+class Renderable(Protocol):
+    def isOpen(self) -> bool: ...
+
+    def needs_render(self, now: float) -> bool: ...
+
+    def refresh(self, force: bool = False): ...
+
+
+class RenderScheduler(QObject):
+    """Redraws all the dirty graph docks in one pass from a single timer.
+
+    Docks that are hidden, tabbed away or minimized are skipped, and stay dirty until they
+    are shown again. Once the frame budget is spent the remaining docks are left for the
+    next frame, starting where the previous frame stopped so no dock is starved. A dock that
+    raises is logged and skipped, the others are still drawn.
+    """
+
+    graphs: List[Renderable]
+
+    def __init__(self, parent=None, frame_rate: float = 30, frame_budget_ms: float = 15) -> None:
+        super().__init__(parent)
+        self.graphs = []
+        self.frame_budget = frame_budget_ms / 1000
+        self._next = 0
+        self.log = logging.getLogger("render scheduler")
+        # Docks whose failure was logged already, so a broken dock does not flood the log
+        self._failed = set()
+
+        self.timer = QTimer(self, singleShot=False, interval=int(1000 / frame_rate))  # type: ignore
+        self.timer.timeout.connect(self.render)
+        self.timer.start()
+
+    def add(self, graph: Renderable):
+        self.graphs.append(graph)
+
+    @staticmethod
+    def is_shown(graph) -> bool:
+        if not isinstance(graph, QWidget):
+            return True
+        return graph.isVisible() and not graph.visibleRegion().isEmpty() and not graph.window().isMinimized()
+
+    def render(self):
+        self.graphs = [graph for graph in self.graphs if graph.isOpen()]
+        if len(self.graphs) == 0:
+            return
+
+        start = time.perf_counter()
+        count = len(self.graphs)
+        first = self._next % count
+
+        for i in range(count):
+            graph = self.graphs[(first + i) % count]
+
+            try:
+                if not graph.needs_render(start) or not self.is_shown(graph):
+                    continue
+
+                if time.perf_counter() - start > self.frame_budget:
+                    # Continue with this graph next frame
+                    self._next = (first + i) % count
+                    return
+
+                graph.refresh(force=True)
+            except Exception:
+                if id(graph) not in self._failed:
+                    self._failed.add(id(graph))
+                    self.log.exception("Failed to render %s", graph)
+
+        self._next = first + 1
@@ -0,0 +1,303 @@
+import json
+import logging
+import time
+import warnings
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+from numpy.lib import recfunctions
+
+# Leading bytes of the binary trace packets, text packets never start with these
+BINARY_DESCRIPTOR = 0x01
+BINARY_DATA = 0x02
+
+# Value types allowed in a binary descriptor, as struct/NumPy type codes
+BINARY_TYPES = "?bBhHiIqQfd"
+
+# Offset from the monotonic receive stamps to the wall clock, sampled once so all outputs agree
+MONOTONIC_TO_WALL_NS = time.time_ns() - time.monotonic_ns()
+
+PACKET_JSON = "json"
+PACKET_CSV = "csv"
+PACKET_DESCRIPTOR = "descriptor"
+PACKET_BINARY = "binary"
+
+
+@dataclass
+class TraceBatch:
+    """A block of decoded trace samples in columnar form"""
+
+    keys: List[str]
+    # Shape (samples, keys), NaN where a key is missing or not numeric
+    values: np.ndarray
+    # Receive time of every sample, time.monotonic_ns() stamped once when the packet arrived
+    timestamps: np.ndarray
+    # The raw decoded objects, only kept when the packets were not parsed in bulk
+    records: List[Dict] | None = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def to_records(self) -> List[Dict]:
+        if self.records is not None:
+            return self.records
+
+        return [dict(zip(self.keys, row)) for row in self.values.tolist()]
+
+    def latest(self) -> Dict:
+        """Last received value of every key in the batch"""
+        if self.records is not None:
+            latest = {}
+            for record in self.records:
+                latest.update(record)
+            return latest
+
+        if len(self) == 0:
+            return {}
+
+        last = self.values[-1]
+        if not np.isnan(last).any():
+            return dict(zip(self.keys, last.tolist()))
+
+        # Look up the last valid row of the keys missing in the final sample
+        valid = ~np.isnan(self.values)
+        rows = len(self) - 1 - np.argmax(valid[::-1], axis=0)
+        return {key: self.values[row, i].item() for i, (key, row) in enumerate(zip(self.keys, rows)) if valid[row, i]}
+
+    @classmethod
+    def empty(cls) -> "TraceBatch":
+        return cls(keys=[], values=np.empty((0, 0)), timestamps=np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def from_records(cls, records: List[Dict], timestamps: Sequence[int]) -> "TraceBatch":
+        columns: Dict[str, int] = {}
+        for record in records:
+            for key in record:
+                if key not in columns:
+                    columns[key] = len(columns)
+
+        values = np.full((len(records), len(columns)), np.nan)
+        for i, record in enumerate(records):
+            for key, value in record.items():
+                try:
+                    values[i, columns[key]] = float(value)
+                except (TypeError, ValueError):
+                    pass
+
+        return cls(
+            keys=list(columns),
+            values=values,
+            timestamps=np.asarray(timestamps, dtype=np.int64),
+            records=records,
+        )
+
+    @classmethod
+    def concat(cls, batches: List["TraceBatch"]) -> "TraceBatch":
+        batches = [batch for batch in batches if len(batch) > 0]
+        if len(batches) == 0:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        columns: Dict[str, int] = {}
+        for batch in batches:
+            for key in batch.keys:
+                if key not in columns:
+                    columns[key] = len(columns)
+
+        values = np.full((sum(len(batch) for batch in batches), len(columns)), np.nan)
+        row = 0
+        for batch in batches:
+            index = [columns[key] for key in batch.keys]
+            values[row : row + len(batch), index] = batch.values
+            row += len(batch)
+
+        # Keep the raw records if any batch has them, so non numeric values are not lost
+        records = None
+        if any(batch.records is not None for batch in batches):
+            records = [record for batch in batches for record in batch.to_records()]
+
+        return cls(
+            keys=list(columns),
+            values=values,
+            timestamps=np.concatenate([batch.timestamps for batch in batches]),
+            records=records,
+        )
+
+
+class TraceDecoder:
+    """Decodes raw trace packets into TraceBatches.
+
+    JSON packets are decoded one by one. CSV packets go through a fast path when schema
+    learning is enabled: the column layout is learned from the first packet, after which
+    a whole run of packets is parsed into a float64 array with a single NumPy call.
+
+    Binary traces start with a descriptor packet, `0x01` followed by the text
+    `name:type,name:type,...` where type is one of the struct codes in BINARY_TYPES. Each
+    data packet is `0x02` followed by the values in descriptor order, packed little endian
+    without padding. Runs of data packets are decoded with a single np.frombuffer call.
+    """
+
+    def __init__(self, learn_schema: bool = True) -> None:
+        self.learn_schema = learn_schema
+        self.csv_columns: int | None = None
+        self.csv_keys: List[str] = []
+
+        self.binary_dtype: np.dtype | None = None
+        self.binary_keys: List[str] = []
+
+        self.log = logging.getLogger("trace decoder")
+
+    def reset(self):
+        self.csv_columns = None
+        self.csv_keys = []
+        self.binary_dtype = None
+        self.binary_keys = []
+
+    def decode(self, packets: List[bytes], timestamps: Sequence[int]) -> TraceBatch:
+        batches = []
+
+        # Split the packets in runs of the same encoding, keeping their order
+        kinds = [self._packet_kind(packet) for packet in packets]
+        run_start = 0
+        for i in range(1, len(packets) + 1):
+            if i < len(packets) and kinds[i] == kinds[run_start]:
+                continue
+
+            batches.append(self._decode_run(kinds[run_start], packets[run_start:i], timestamps[run_start:i]))
+            run_start = i
+
+        return TraceBatch.concat(batches)
+
+    @staticmethod
+    def _packet_kind(packet: bytes) -> str:
+        first = packet[0] if len(packet) > 0 else None
+        if first == ord("{"):
+            return PACKET_JSON
+        if first == BINARY_DESCRIPTOR:
+            return PACKET_DESCRIPTOR
+        if first == BINARY_DATA:
+            return PACKET_BINARY
+        return PACKET_CSV
+
+    def _decode_run(self, kind: str, packets: List[bytes], timestamps: Sequence[int]) -> TraceBatch:
+        if kind == PACKET_DESCRIPTOR:
+            for packet in packets:
+                self._load_descriptor(packet)
+            return TraceBatch.empty()
+
+        if kind == PACKET_BINARY:
+            return self._decode_binary(packets, timestamps)
+
+        # Drop empty packets, they carry no samples
+        keep = [i for i, packet in enumerate(packets) if len(packet.strip(b"\x00\r\n ")) > 0]
+        if len(keep) != len(packets):
+            packets = [packets[i] for i in keep]
+            timestamps = [timestamps[i] for i in keep]
+
+        if len(packets) == 0:
+            return TraceBatch.empty()
+
+        if kind == PACKET_JSON:
+            return self._decode_json(packets, timestamps)
+
+        if self.learn_schema:
+            batch = self._decode_csv_fast(packets, timestamps)
+            if batch is not None:
+                return batch
+
+        return self._decode_csv(packets, timestamps)
+
+    def _load_descriptor(self, packet: bytes):
+        fields = []
+        try:
+            for field in packet[1:].decode("utf-8").strip("\x00\r\n ").split(","):
+                name, type_code = field.rsplit(":", 1)
+                if type_code not in BINARY_TYPES:
+                    raise ValueError(f"Unsupported type {type_code!r}")
+                fields.append((name.strip(), "<" + type_code))
+
+            dtype = np.dtype(fields)
+        except (UnicodeDecodeError, ValueError, TypeError):
+            self.log.exception("Invalid binary trace descriptor: %r", packet[:64])
+            return
+
+        self.binary_dtype = dtype
+        self.binary_keys = [name for name, _ in fields]
+
+    def _decode_binary(self, packets: List[bytes], timestamps: Sequence[int]) -> TraceBatch:
+        if self.binary_dtype is None:
+            self.log.warning("Dropped %d binary trace packets, no descriptor received", len(packets))
+            return TraceBatch.empty()
+
+        size = 1 + self.binary_dtype.itemsize
+        if any(len(packet) != size for packet in packets):
+            keep = [i for i, packet in enumerate(packets) if len(packet) == size]
+            self.log.warning("Dropped %d binary trace packets not matching the descriptor", len(packets) - len(keep))
+            packets = [packets[i] for i in keep]
+            timestamps = [timestamps[i] for i in keep]
+
+            if len(packets) == 0:
+                return TraceBatch.empty()
+
+        samples = np.frombuffer(b"".join(packet[1:] for packet in packets), dtype=self.binary_dtype)
+
+        return TraceBatch(
+            keys=self.binary_keys,
+            values=recfunctions.structured_to_unstructured(samples, dtype=np.float64),
+            timestamps=np.asarray(timestamps, dtype=np.int64),
+        )
+
+    def _decode_json(self, packets: List[bytes], timestamps: Sequence[int]) -> TraceBatch:
+        records = []
+        valid_timestamps = []
+        for packet, timestamp in zip(packets, timestamps):
+            try:
+                records.append(json.loads(packet))
+            except ValueError:
+                # A corrupt packet should not take the rest of the batch with it
+                self.log.warning("Dropped invalid JSON trace packet: %r", packet[:64])
+                continue
+            valid_timestamps.append(timestamp)
+
+        return TraceBatch.from_records(records, valid_timestamps)
+
+    def _decode_csv(self, packets: List[bytes], timestamps: Sequence[int]) -> TraceBatch:
+        records = []
+        for packet in packets:
+            record = {}
+            for i, key in enumerate(packet.decode("utf-8").split(",")):
+                record[f"item {i}"] = key
+            records.append(record)
+
+        return TraceBatch.from_records(records, timestamps)
+
+    def _decode_csv_fast(self, packets: List[bytes], timestamps: Sequence[int]) -> TraceBatch | None:
+        packets = [packet.strip(b"\x00\r\n ") for packet in packets]
+
+        if self.csv_columns is None or packets[0].count(b",") + 1 != self.csv_columns:
+            # (Re)learn the layout from the first packet
+            self.csv_columns = packets[0].count(b",") + 1
+            self.csv_keys = [f"item {i}" for i in range(self.csv_columns)]
+
+        separators = self.csv_columns - 1
+        if any(packet.count(b",") != separators for packet in packets):
+            return None
+
+        with warnings.catch_warnings():
+            # Depending on the NumPy version unparsable text raises or yields a short array
+            warnings.simplefilter("ignore", DeprecationWarning)
+            try:
+                values = np.fromstring(b",".join(packets).decode("utf-8"), sep=",")
+            except ValueError:
+                return None
+
+        if values.size != len(packets) * self.csv_columns:
+            return None
+
+        return TraceBatch(
+            keys=self.csv_keys,
+            values=values.reshape(len(packets), self.csv_columns),
+            timestamps=np.asarray(timestamps, dtype=np.int64),
+        )
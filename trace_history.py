@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .data_output.output_sink import OutputSink
+from .trace_decoder import TraceBatch
+
+# Number of records of a level summarized by one record of the level above
+LEVEL_FACTOR = 16
+
+SAMPLE_DTYPE = np.dtype([("time", "<f8"), ("value", "<f8")])
+SUMMARY_DTYPE = np.dtype([("time", "<f8"), ("min", "<f8"), ("max", "<f8")])
+
+
+class _HistoryLevel:
+    """Append-only file of records, read back through a memory map.
+
+    Appended records are buffered and written by `flush`, which opens the file only for
+    the write. A session with hundreds of keys would run out of file handles otherwise.
+    Readers only see the flushed records.
+    """
+
+    # Buffered bytes that trigger a write on their own
+    BUFFER_SIZE = 1 << 20
+
+    def __init__(self, path: str, dtype: np.dtype) -> None:
+        self.path = path
+        self.dtype = dtype
+        self.count = 0
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._map = None
+
+        # Create the file, so a reader never finds it missing
+        open(path, "wb").close()
+
+    def append(self, records: np.ndarray):
+        self._buffer.append(records.tobytes())
+        self._buffered += len(records)
+        if self._buffered * self.dtype.itemsize >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._buffered == 0:
+            return
+
+        with open(self.path, "ab") as f:
+            f.write(b"".join(self._buffer))
+        self.count += self._buffered
+        self._buffer = []
+        self._buffered = 0
+
+    def records(self) -> np.ndarray:
+        if self.count == 0:
+            return np.empty(0, dtype=self.dtype)
+
+        # Remap when the file has grown past the mapped part
+        if self._map is None or len(self._map) < self.count:
+            self._map = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.count,))
+
+        return self._map[: self.count]
+
+    def close(self):
+        self.flush()
+        self._map = None
+
+
+class TraceHistory:
+    """On-disk history of a single trace key with a min/max level of detail pyramid.
+
+    Level 0 holds every (time, value) sample, each level above holds the (time, min, max)
+    of blocks of LEVEL_FACTOR records of the level below. A query reads the finest level
+    that fits in the requested number of points, so hours of data can be shown by reading
+    only a few thousand records.
+    """
+
+    levels: List[_HistoryLevel]
+
+    def __init__(self, path_prefix: str) -> None:
+        self.path_prefix = path_prefix
+        self.levels = [_HistoryLevel(f"{path_prefix}.0.bin", SAMPLE_DTYPE)]
+        # Records of every level waiting to fill a block of the level above
+        self._pending = [np.empty(0, dtype=SUMMARY_DTYPE)]
+        self.lock = threading.Lock()
+
+    def append(self, times: np.ndarray, values: np.ndarray):
+        samples = np.empty(len(times), dtype=SAMPLE_DTYPE)
+        samples["time"] = times
+        samples["value"] = values
+
+        # Level 0 samples are summaries of a single value
+        summary = np.empty(len(times), dtype=SUMMARY_DTYPE)
+        summary["time"] = times
+        summary["min"] = values
+        summary["max"] = values
+
+        with self.lock:
+            self.levels[0].append(samples)
+
+            level = 0
+            while len(summary) > 0:
+                pending = np.concatenate((self._pending[level], summary))
+                full = len(pending) // LEVEL_FACTOR * LEVEL_FACTOR
+                self._pending[level] = pending[full:].copy()
+
+                if full == 0:
+                    break
+
+                blocks = pending[:full].reshape(-1, LEVEL_FACTOR)
+                summary = np.empty(len(blocks), dtype=SUMMARY_DTYPE)
+                summary["time"] = blocks["time"][:, 0]
+                summary["min"] = np.fmin.reduce(blocks["min"], axis=1)
+                summary["max"] = np.fmax.reduce(blocks["max"], axis=1)
+
+                level += 1
+                if level == len(self.levels):
+                    self.levels.append(_HistoryLevel(f"{self.path_prefix}.{level}.bin", SUMMARY_DTYPE))
+                    self._pending.append(np.empty(0, dtype=SUMMARY_DTYPE))
+
+                self.levels[level].append(summary)
+
+    def flush(self):
+        with self.lock:
+            for history_level in self.levels:
+                history_level.flush()
+
+    def start_time(self) -> float | None:
+        with self.lock:
+            records = self.levels[0].records()
+            return float(records["time"][0]) if len(records) > 0 else None
+
+    def query(self, start: float, stop: float, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples between start and stop, from the finest level that fits in max_points"""
+        with self.lock:
+            for level, history_level in enumerate(self.levels):
+                records = history_level.records()
+                times = records["time"]
+
+                # One record outside the range on each side, so the lines reach the edges
+                first = max(int(np.searchsorted(times, start)) - 1, 0)
+                last = min(int(np.searchsorted(times, stop)) + 1, len(records))
+
+                # Summary records are drawn as a min and a max point
+                points = (last - first) * (1 if level == 0 else 2)
+                if points > max_points and level < len(self.levels) - 1:
+                    continue
+
+                chunk = np.array(records[first:last])
+                if level == 0:
+                    return chunk["time"], chunk["value"]
+
+                x = np.repeat(chunk["time"], 2)
+                y = np.empty(len(x))
+                y[0::2] = chunk["min"]
+                y[1::2] = chunk["max"]
+                return x, y
+
+        return np.empty(0), np.empty(0)
+
+    def close(self):
+        with self.lock:
+            for history_level in self.levels:
+                history_level.close()
+
+
+class TraceHistoryStore(OutputSink):
+    """Disk-backed history of every trace key of a session.
+
+    Each session gets its own directory, with the files of every key and a keys.json
+    mapping the key names to their file prefix. Runs as a sink of OutputDispatcher, the
+    files are written at most every FLUSH_SECONDS, or sooner when a level has buffered
+    a lot, so queries see the newest second or so only after a short delay.
+    """
+
+    name = "history"
+
+    # Buffered records are written at least this often
+    FLUSH_SECONDS = 1
+
+    histories: Dict[str, TraceHistory]
+
+    def __init__(self, base_path: str, start_time_ns: int) -> None:
+        self.path = os.path.join(base_path, time.strftime("%Y%m%d-%H%M%S") + "_history")
+        os.makedirs(self.path, exist_ok=True)
+
+        # Origin of the time axis, in time.monotonic_ns(), same as the TraceStore
+        self.start_time_ns = start_time_ns
+        self.histories = {}
+        self._files: Dict[str, str] = {}
+        self.last_flush = time.monotonic()
+
+    def get(self, key: str) -> TraceHistory | None:
+        return self.histories.get(key)
+
+    def _create(self, key: str) -> TraceHistory:
+        prefix = f"{len(self.histories):04d}"
+        history = TraceHistory(os.path.join(self.path, prefix))
+        self._files[key] = prefix
+
+        with open(os.path.join(self.path, "keys.json"), "w") as f:
+            json.dump(self._files, f, indent=2)
+
+        self.histories[key] = history
+        return history
+
+    def append_batch(self, batch: TraceBatch):
+        timestamps = (batch.timestamps - self.start_time_ns) / 1e9
+
+        for i, key in enumerate(batch.keys):
+            column = batch.values[:, i]
+            valid = ~np.isnan(column)
+            if not valid.any():
+                continue
+
+            history = self.histories.get(key)
+            if history is None:
+                history = self._create(key)
+
+            if valid.all():
+                history.append(timestamps, column)
+            else:
+                history.append(timestamps[valid], column[valid])
+
+    def write_batches(self, batches: List[TraceBatch]):
+        """Append the batches, runs on the sink worker"""
+        # One append per key for everything that queued up, the cost is mostly per call
+        self.append_batch(TraceBatch.concat(batches))
+
+        if time.monotonic() - self.last_flush >= self.FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        for history in list(self.histories.values()):
+            history.flush()
+
+    def close(self):
+        for history in list(self.histories.values()):
+            history.close()
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .data_output.npz_output import NPZRecording
+from .trace_decoder import BINARY_DATA, BINARY_DESCRIPTOR
+
+
+def load_recording(path: str) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Load a CSVOutput or NPZOutput recording as (time in seconds, keys, values)"""
+    if path.endswith(".trace"):
+        recording = NPZRecording(path)
+        try:
+            times, columns = recording.read()
+        finally:
+            recording.close()
+        keys = list(columns)
+        values = np.column_stack([columns[key] for key in keys]) if keys else np.empty((len(times), 0))
+        return times, keys, values
+
+    with open(path, newline="") as f:
+        header = f.readline().strip("\r\n").split(",")
+    if "time" not in header:
+        raise ValueError(f"{path} has no time column")
+
+    try:
+        data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    except ValueError:
+        # Non numeric values, these are replayed as missing
+        data = np.genfromtxt(path, delimiter=",", skip_header=1, ndmin=2)
+
+    time_column = header.index("time")
+    keys = [key for i, key in enumerate(header) if i != time_column]
+    values = np.delete(data, time_column, axis=1)
+    return data[:, time_column], keys, values
+
+
+class TraceReplay:
+    """Plays a recorded trace back as if it came from the Eros trace channel.
+
+    Offers the same `attach_channel_callback` as Eros, so the recording goes through the
+    normal decode path and the table, graphs and outputs behave as they did live. The
+    samples are sent as binary trace packets at the recorded pace times `speed`, or as
+    fast as possible with speed 0. Playback can be paused and moved with `seek`.
+
+    Callbacks also get the time of each packet in time.monotonic_ns(), the recorded offset
+    from a per-replay origin, so the sample times do not depend on the speed. The origin
+    moves past the last packet sent on a seek or restart, the times never run backwards.
+    """
+
+    # Samples sent in one go, keeps pause and seek responsive at high speeds
+    MAX_BATCH = 1000
+
+    callbacks: Dict[int, List[Callable[[bytes, int], None]]]
+
+    def __init__(self, path: str, channel: int, speed: float = 1) -> None:
+        self.path = path
+        self.channel = channel
+        self.times, self.keys, values = load_recording(path)
+        if len(self.times) == 0:
+            raise ValueError(f"{path} holds no samples")
+
+        # The descriptor uses commas as separator
+        names = ",".join(f"{key.replace(',', ';')}:d" for key in self.keys)
+        self.descriptor = bytes([BINARY_DESCRIPTOR]) + names.encode()
+        self.rows = np.ascontiguousarray(values, dtype="<f8")
+        self.descriptor_sent = False
+
+        self.log = logging.getLogger("trace replay")
+        self.callbacks = {}
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.speed = speed
+        self.position = 0
+        self.paused = False
+        self.stopped = False
+        self.last_timestamp = 0
+        self._anchor()
+        self._rebase()
+
+        self.thread = threading.Thread(target=self.run, daemon=True, name="trace replay")
+        self.thread.start()
+
+    @property
+    def duration(self) -> float:
+        return float(self.times[-1] - self.times[0])
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= len(self.times)
+
+    def current_time(self) -> float:
+        """Playback position in seconds since the start of the recording"""
+        position = min(self.position, len(self.times) - 1)
+        return float(self.times[position] - self.times[0])
+
+    def attach_channel_callback(self, channel: int, callback: Callable[[bytes, int], None]):
+        with self.lock:
+            self.callbacks.setdefault(channel, []).append(callback)
+            # A new listener needs the descriptor before any data
+            self.descriptor_sent = False
+
+    def _anchor(self):
+        # Recorded time and wall clock time that correspond, the pace is measured from here
+        self.anchor_time = self.times[min(self.position, len(self.times) - 1)]
+        self.anchor_wall = time.perf_counter()
+
+    def _rebase(self):
+        # Time origin of the packets, the current position follows the last packet sent
+        offset = int((self.times[min(self.position, len(self.times) - 1)] - self.times[0]) * 1e9)
+        self.origin_ns = max(self.last_timestamp + 1, time.monotonic_ns()) - offset
+
+    def set_speed(self, speed: float):
+        with self.lock:
+            self.speed = speed
+            self._anchor()
+        self.wake.set()
+
+    def pause(self):
+        with self.lock:
+            self.paused = True
+
+    def resume(self):
+        with self.lock:
+            if self.finished:
+                self.position = 0
+                self._rebase()
+            self.paused = False
+            self._anchor()
+        self.wake.set()
+
+    def seek(self, seconds: float):
+        with self.lock:
+            self.position = min(int(np.searchsorted(self.times, self.times[0] + seconds)), len(self.times) - 1)
+            self._anchor()
+            self._rebase()
+        self.wake.set()
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped:
+            delay = 0.1
+            with self.lock:
+                callbacks = list(self.callbacks.get(self.channel, []))
+                if len(callbacks) == 0:
+                    # Nobody is listening yet, playback starts once somebody is
+                    self._anchor()
+
+                start = end = self.position
+                if not self.paused and not self.finished and len(callbacks) > 0:
+                    if self.speed <= 0:
+                        end = min(start + self.MAX_BATCH, len(self.times))
+                    else:
+                        now = self.anchor_time + (time.perf_counter() - self.anchor_wall) * self.speed
+                        end = min(int(np.searchsorted(self.times, now, side="right")), start + self.MAX_BATCH)
+                        delay = (self.times[start] - now) / self.speed
+
+                    self.position = end
+                    self.paused = self.finished
+
+                send_descriptor = not self.descriptor_sent and len(callbacks) > 0
+                self.descriptor_sent = self.descriptor_sent or send_descriptor
+
+                origin = self.origin_ns
+                timestamps = origin + ((self.times[start:end] - self.times[0]) * 1e9).astype(np.int64)
+                if end > start:
+                    self.last_timestamp = int(timestamps[-1])
+
+            if send_descriptor:
+                for callback in callbacks:
+                    callback(self.descriptor, origin)
+
+            if end == start:
+                # Sleep until the next sample is due, or until pause, seek or speed changes
+                self.wake.wait(min(max(delay, 0.001), 0.1))
+                self.wake.clear()
+                continue
+
+            data = bytes([BINARY_DATA])
+            for row, timestamp in zip(self.rows[start:end], timestamps.tolist()):
+                packet = data + row.tobytes()
+                for callback in callbacks:
+                    try:
+                        callback(packet, timestamp)
+                    except Exception:
+                        self.log.exception("Replay callback failed")
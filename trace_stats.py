@@ -0,0 +1,193 @@
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .trace_decoder import TraceBatch
+from .trace_store import RingBuffer
+
+STATS_HEADERS = ["Min", "Max", "Mean", "Std", "Rate"]
+
+
+class MonotonicQueue:
+    """Sliding window maximum, a monotonic deque that takes whole batches at once.
+
+    Only the samples that are larger than every later sample can become the maximum, so
+    those are the only ones kept, in decreasing order. The front is the window maximum.
+    """
+
+    def __init__(self) -> None:
+        self.index = np.empty(0, dtype=np.int64)
+        self.value = np.empty(0)
+
+    def push(self, index: np.ndarray, values: np.ndarray):
+        # Candidates within the batch: larger than everything after them
+        later_max = np.append(np.maximum.accumulate(values[::-1])[::-1][1:], -np.inf)
+        candidates = values > later_max
+
+        # Earlier candidates survive only if they are larger than the whole batch
+        keep = self.value > values.max()
+        self.index = np.concatenate((self.index[keep], index[candidates]))
+        self.value = np.concatenate((self.value[keep], values[candidates]))
+
+    def expire(self, oldest: int):
+        """Drop the samples with an index before oldest"""
+        start = int(np.searchsorted(self.index, oldest))
+        if start > 0:
+            self.index = self.index[start:]
+            self.value = self.value[start:]
+
+    def front(self) -> float:
+        return float(self.value[0]) if len(self.value) > 0 else np.nan
+
+    def clear(self):
+        self.index = np.empty(0, dtype=np.int64)
+        self.value = np.empty(0)
+
+
+class RollingStats:
+    """Min, max, mean, standard deviation and rate over the last `window` samples of a key.
+
+    The mean and variance are kept with Welford's algorithm, extended to add and remove
+    whole groups of samples (Chan et al.), the extremes with monotonic queues. A batch costs
+    O(batch) work no matter how large the window is.
+    """
+
+    def __init__(self, window: int) -> None:
+        self.window = max(2, window)
+        # Samples in the window, the oldest ones are removed from the statistics
+        self.times = RingBuffer(self.window, slack=0)
+        self.values = RingBuffer(self.window, slack=0)
+        self.total = 0
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max_queue = MonotonicQueue()
+        self.min_queue = MonotonicQueue()
+
+    def update(self, times: np.ndarray, values: np.ndarray):
+        if len(values) > self.window:
+            times, values = times[-self.window :], values[-self.window :]
+
+        leaving = len(self.values) + len(values) - self.window
+        if leaving > 0:
+            self._remove(self.values.values()[:leaving])
+        self._add(values)
+
+        self.times.extend(times)
+        self.values.extend(values)
+
+        index = self.total + np.arange(len(values))
+        self.total += len(values)
+        self.max_queue.push(index, values)
+        self.min_queue.push(index, -values)
+        self.max_queue.expire(self.total - self.window)
+        self.min_queue.expire(self.total - self.window)
+
+    def _add(self, values: np.ndarray):
+        count = len(values)
+        mean = values.mean()
+        m2 = float(np.square(values - mean).sum())
+
+        n = self.n + count
+        delta = mean - self.mean
+        self.mean += delta * count / n
+        self.m2 += m2 + delta * delta * self.n * count / n
+        self.n = n
+
+    def _remove(self, values: np.ndarray):
+        count = len(values)
+        if count >= self.n:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+
+        mean = values.mean()
+        m2 = float(np.square(values - mean).sum())
+
+        n = self.n - count
+        remaining_mean = (self.n * self.mean - count * mean) / n
+        delta = mean - remaining_mean
+        self.m2 = max(self.m2 - m2 - delta * delta * n * count / self.n, 0.0)
+        self.mean = remaining_mean
+        self.n = n
+
+    def result(self) -> Tuple[float, float, float, float, float]:
+        """(min, max, mean, standard deviation, rate in Hz)"""
+        std = np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+        rate = np.nan
+        if self.n > 1:
+            times = self.times.values()
+            duration = times[-1] - times[0]
+            rate = (self.n - 1) / duration if duration > 0 else np.nan
+
+        return -self.min_queue.front(), self.max_queue.front(), self.mean, std, rate
+
+
+class TraceStats:
+    """Rolling statistics of every trace key, updated from the decode thread.
+
+    The decode thread hands in small batches, so they are collected and applied together
+    once enough samples or time has passed. The GUI picks up the keys that changed with
+    `snapshot`, which also applies what is left when the stream has stopped.
+    """
+
+    stats: Dict[str, RollingStats]
+
+    # Apply the collected batches after this many samples or seconds
+    FLUSH_SAMPLES = 256
+    FLUSH_INTERVAL = 0.1
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.stats = {}
+        self.lock = threading.Lock()
+
+        self._pending: List[TraceBatch] = []
+        self._pending_samples = 0
+        self._last_flush = time.perf_counter()
+        self._changed = set()
+
+    def update(self, batch: TraceBatch):
+        with self.lock:
+            self._pending.append(batch)
+            self._pending_samples += len(batch)
+
+            if (
+                self._pending_samples >= self.FLUSH_SAMPLES
+                or time.perf_counter() - self._last_flush >= self.FLUSH_INTERVAL
+            ):
+                self._flush()
+
+    def _flush(self):
+        batch = TraceBatch.concat(self._pending)
+        self._pending = []
+        self._pending_samples = 0
+        self._last_flush = time.perf_counter()
+
+        times = batch.timestamps / 1e9
+        for i, key in enumerate(batch.keys):
+            column = batch.values[:, i]
+            valid = ~np.isnan(column)
+            if not valid.any():
+                continue
+
+            if key not in self.stats:
+                self.stats[key] = RollingStats(self.window)
+
+            if valid.all():
+                self.stats[key].update(times, column)
+            else:
+                self.stats[key].update(times[valid], column[valid])
+
+            self._changed.add(key)
+
+    def snapshot(self) -> Dict[str, Tuple[float, float, float, float, float]]:
+        """Statistics of the keys that changed since the previous snapshot"""
+        with self.lock:
+            if len(self._pending) > 0 and time.perf_counter() - self._last_flush >= self.FLUSH_INTERVAL:
+                self._flush()
+
+            changed, self._changed = self._changed, set()
+            return {key: self.stats[key].result() for key in changed}
@@ -0,0 +1,154 @@
+from typing import Dict, Iterable
+
+import numpy as np
+
+from .trace_decoder import TraceBatch
+
+
+class RingBuffer:
+    """Fixed capacity float64 ring buffer backed by a preallocated NumPy array.
+
+    Every value is stored twice, at i and i + size, so the newest values are always
+    contiguous and `values` returns a view instead of a copy. The ring holds `slack` more
+    values than the capacity, so a returned view stays valid for at least that many appends.
+    Nothing checks that, whatever keeps a view for longer (like a plot) has to copy it.
+    """
+
+    def __init__(self, capacity: int, slack: int | None = None) -> None:
+        self.capacity = max(1, int(capacity))
+        self.slack = max(4096, self.capacity // 8) if slack is None else slack
+        self._size = self.capacity + self.slack
+        self._data = np.full(2 * self._size, np.nan)
+        self._head = 0  # Next write position
+        self._count = 0
+        # Number of values ever appended, lets readers tell how many are new since they last looked
+        self.written = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value: float):
+        self._data[self._head] = value
+        self._data[self._head + self._size] = value
+        self._head = (self._head + 1) % self._size
+        self._count = min(self._count + 1, self.capacity)
+        self.written += 1
+
+    def extend(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=np.float64)
+        self.written += len(values)
+
+        # Only the newest samples fit
+        if len(values) > self._size:
+            values = values[-self._size :]
+
+        n = len(values)
+        if n == 0:
+            return
+
+        # The first copy may run into the second half, its mirror then wraps to the start
+        end = self._head + n
+        self._data[self._head : end] = values
+        if end <= self._size:
+            self._data[self._head + self._size : end + self._size] = values
+        else:
+            split = self._size - self._head
+            self._data[self._head + self._size :] = values[:split]
+            self._data[: end - self._size] = values[split:]
+
+        self._head = end % self._size
+        self._count = min(self._count + n, self.capacity)
+
+    def values(self, last: int | None = None) -> np.ndarray:
+        """Return a view of the (last n) buffered values, oldest first"""
+        n = self._count if last is None else min(last, self._count)
+        end = self._head + self._size
+        return self._data[end - n : end]
+
+    def align(self, other: "RingBuffer"):
+        """Start at the same position as another ring of the same size, the skipped values stay NaN"""
+        self._head = other._head
+        self._count = other._count
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+        self.written = 0
+
+
+class TraceSeries:
+    """Value ring buffer of a single trace key, next to the time ring it shares with all keys"""
+
+    def __init__(self, time: RingBuffer, capacity: int) -> None:
+        self.time = time
+        self.value = RingBuffer(capacity)
+        self.value.align(time)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def clear(self):
+        self.value.clear()
+
+
+class TraceStore:
+    """Columnar store of the received trace samples, one series per key.
+
+    The store is owned by the trace widget and shared by reference with all the graphs,
+    so a key costs a single append no matter how many graphs plot it. All the keys share a
+    single time axis, a key that is missing from a sample holds NaN at that position.
+
+    Only the keys requested with `get` are kept, each one takes about 18 bytes per point of
+    capacity (mirrored float64 plus slack), see `nbytes`. The values of other keys are
+    dropped, the disk history keeps those.
+    """
+
+    series: Dict[str, TraceSeries]
+
+    def __init__(self, capacity: int, start_time_ns: int = 0) -> None:
+        self.capacity = max(1, capacity)
+        # Origin of the time axis, in time.monotonic_ns()
+        self.start_time_ns = start_time_ns
+        self.time = RingBuffer(self.capacity)
+        self.series = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.series
+
+    def get(self, key: str) -> TraceSeries:
+        # Series are created on demand, so a graph can be created before the key is received
+        if key not in self.series:
+            self.series[key] = TraceSeries(self.time, self.capacity)
+        return self.series[key]
+
+    def retain(self, keys: Iterable[str]):
+        """Drop the series of all other keys, once nothing plots them anymore"""
+        keys = set(keys)
+        self.series = {key: series for key, series in self.series.items() if key in keys}
+
+    def append_batch(self, batch: TraceBatch):
+        self.time.extend((batch.timestamps - self.start_time_ns) / 1e9)
+
+        # Missing and non numeric values are already NaN in the batch
+        for i, key in enumerate(batch.keys):
+            key_series = self.series.get(key)
+            if key_series is not None:
+                key_series.value.extend(batch.values[:, i])
+
+        # Keys that are not in the batch at all are padded to keep the series aligned
+        keys = set(batch.keys)
+        missing = [key_series for key, key_series in self.series.items() if key not in keys]
+        if len(missing) > 0:
+            padding = np.full(len(batch), np.nan)
+            for series in missing:
+                series.value.extend(padding)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the time axis and the requested series"""
+        return self.time._data.nbytes + sum(series.value._data.nbytes for series in self.series.values())
+
+    def clear(self):
+        self.time.clear()
+        for series in self.series.values():
+            series.clear()
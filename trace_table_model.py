@@ -0,0 +1,129 @@
+from typing import Dict, List, Tuple
+
+from qtpy.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from .trace_stats import STATS_HEADERS
+
+
+class TraceTableModel(QAbstractTableModel):
+    """Table of the latest value of every trace key.
+
+    Rows are looked up through a key to row index, and a refresh emits ranged dataChanged
+    signals instead of updating the cells one by one. With `show_stats` the rolling
+    statistics of every key are shown in extra columns.
+    """
+
+    HEADERS = ["Key", "Value"]
+
+    keys: List[str]
+    rows: Dict[str, int]
+    values: List[str]
+    stats: List[List[str]]
+
+    def __init__(self, parent=None, show_stats: bool = False) -> None:
+        super().__init__(parent)
+        self.headers = self.HEADERS + (STATS_HEADERS if show_stats else [])
+        self.keys = []
+        self.rows = {}
+        self.values = []
+        self.stats = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.keys)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        if index.column() == 0:
+            return self.keys[index.row()]
+
+        if index.column() == 1:
+            return self.values[index.row()]
+
+        return self.stats[index.row()][index.column() - 2]
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def key(self, row: int) -> str:
+        return self.keys[row]
+
+    def _add_keys(self, keys) -> bool:
+        new_keys = [key for key in keys if key not in self.rows]
+
+        if len(new_keys) > 0:
+            first = len(self.keys)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_keys) - 1)
+            for key in new_keys:
+                self.rows[key] = len(self.keys)
+                self.keys.append(key)
+                self.values.append("")
+                self.stats.append([""] * len(STATS_HEADERS))
+            self.endInsertRows()
+
+        return len(new_keys) > 0
+
+    def update(self, latest: Dict) -> bool:
+        """Set the values of the given keys, returns True if new keys were added.
+
+        Only the cells whose formatted value changed are reported to the view.
+        """
+        added = self._add_keys(latest)
+
+        changed_rows = []
+        for key, value in latest.items():
+            row = self.rows[key]
+            text = str(value)
+            if self.values[row] != text:
+                self.values[row] = text
+                changed_rows.append(row)
+
+        self._emit_changed(changed_rows, 1, 1)
+        return added
+
+    def update_stats(self, stats: Dict[str, Tuple[float, ...]]) -> bool:
+        """Set the rolling statistics of the given keys, returns True if new keys were added"""
+        added = self._add_keys(stats)
+
+        changed_rows = []
+        for key, key_stats in stats.items():
+            row = self.rows[key]
+            *values, rate = key_stats
+            texts = [f"{value:.6g}" for value in values] + [f"{rate:.1f} Hz"]
+            if self.stats[row] != texts:
+                self.stats[row] = texts
+                changed_rows.append(row)
+
+        self._emit_changed(changed_rows, 2, len(self.headers) - 1)
+        return added
+
+    def _emit_changed(self, changed_rows: List[int], first_column: int, last_column: int):
+        """Emit one dataChanged per run of consecutive changed rows"""
+        if len(changed_rows) == 0:
+            return
+
+        changed_rows.sort()
+        first_row = last_row = changed_rows[0]
+        for row in changed_rows[1:] + [None]:
+            if row != last_row + 1:
+                self.dataChanged.emit(
+                    self.index(first_row, first_column),
+                    self.index(last_row, last_column),
+                    [Qt.ItemDataRole.DisplayRole],
+                )
+                first_row = row
+            last_row = row
+
+    def clear(self):
+        self.beginResetModel()
+        self.keys = []
+        self.rows = {}
+        self.values = []
+        self.stats = []
+        self.endResetModel()
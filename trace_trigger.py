@@ -0,0 +1,129 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .trace_store import TraceStore
+
+TRIGGER_OFF = "off"
+TRIGGER_RISING = "rising"
+TRIGGER_FALLING = "falling"
+TRIGGER_ABOVE = "above"
+TRIGGER_BELOW = "below"
+TRIGGER_MODES = [TRIGGER_OFF, TRIGGER_RISING, TRIGGER_FALLING, TRIGGER_ABOVE, TRIGGER_BELOW]
+
+TRIGGER_ARMED = "Armed"
+TRIGGER_CAPTURING = "Capturing"
+TRIGGER_STOPPED = "Triggered"
+
+
+class TraceTrigger:
+    """Oscilloscope style trigger on one key of the trace store.
+
+    While armed, the samples received since the previous check are tested at once for an
+    edge through, or a value beyond, the trigger level. After a trigger the capture is
+    complete once `post_samples` more samples were received. It is then copied out of the
+    store, with `pre_samples` before the trigger, which the store's ring keeps anyway. The
+    capture stays until the next one, with `auto_rearm` the trigger arms itself again.
+    """
+
+    capture: Tuple[np.ndarray, Dict[str, np.ndarray]] | None
+
+    def __init__(
+        self,
+        store: TraceStore,
+        key: str,
+        columns: List[str],
+        mode: str = TRIGGER_RISING,
+        level: float = 0,
+        pre_samples: int = 100,
+        post_samples: int = 900,
+        auto_rearm: bool = True,
+    ) -> None:
+        self.store = store
+        self.key = key
+        self.columns = columns
+        self.mode = mode
+        self.level = level
+        self.auto_rearm = auto_rearm
+
+        # The whole capture has to fit in the store
+        self.post_samples = max(1, min(post_samples, store.capacity - 1))
+        self.pre_samples = max(0, min(pre_samples, store.capacity - self.post_samples))
+
+        self.capture = None
+        self.arm()
+
+    def arm(self):
+        self.state = TRIGGER_ARMED
+        # Samples of the time axis that have been checked
+        self.checked = self.store.time.written
+        self.trigger_index = 0
+        self.last_value = np.nan
+
+    def process(self) -> bool:
+        """Check the new samples, returns True when a capture was completed"""
+        written = self.store.time.written
+        if written < self.checked:
+            # The store was cleared
+            self.arm()
+            return False
+
+        if self.state == TRIGGER_ARMED:
+            new = min(written - self.checked, len(self.store.time))
+            self.checked = written
+
+            hit = self.find(self.store.get(self.key).value.values(new)) if new > 0 else None
+            if hit is None:
+                return False
+
+            self.trigger_index = written - new + hit
+            self.state = TRIGGER_CAPTURING
+
+        if self.state != TRIGGER_CAPTURING or written < self.trigger_index + self.post_samples:
+            return False
+
+        self.take_capture(written)
+
+        if self.auto_rearm:
+            self.arm()
+        else:
+            self.state = TRIGGER_STOPPED
+        return True
+
+    def find(self, values: np.ndarray) -> int | None:
+        """Index of the first sample that meets the trigger condition"""
+        index = np.flatnonzero(~np.isnan(values))
+        if len(index) == 0:
+            return None
+        values = values[index]
+
+        if self.mode in (TRIGGER_RISING, TRIGGER_FALLING):
+            # Edges are also found across batches and missing samples
+            previous = np.concatenate(([self.last_value], values[:-1]))
+            if self.mode == TRIGGER_RISING:
+                hits = (previous < self.level) & (values >= self.level)
+            else:
+                hits = (previous > self.level) & (values <= self.level)
+        elif self.mode == TRIGGER_ABOVE:
+            hits = values > self.level
+        else:
+            hits = values < self.level
+
+        self.last_value = values[-1]
+
+        first = int(np.argmax(hits))
+        return int(index[first]) if hits[first] else None
+
+    def take_capture(self, written: int):
+        times = self.store.time.values()
+        count = len(times)
+
+        # Positions in the ring, which may hold a few samples more than the capture by now
+        trigger = count - (written - self.trigger_index)
+        end = min(trigger + self.post_samples, count)
+        start = max(trigger - self.pre_samples, 0)
+
+        # Relative to the trigger, copied so the store can move on
+        x = times[start:end] - times[max(trigger, 0)]
+        values = {column: self.store.get(column).value.values()[start:end].copy() for column in self.columns}
+        self.capture = (x, values)
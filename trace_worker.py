@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from queue import Empty, Queue
+from typing import Callable, List, Tuple
+
+from .trace_decoder import TraceBatch, TraceDecoder
+
+
+class TraceDecodeWorker:
+    """Decodes trace packets on a background thread.
+
+    Packets from the Eros channel callback are queued, drained and decoded in batches. The
+    batch callbacks (the data outputs) run on the worker thread, while the GUI collects all
+    the batches decoded since its last frame in one go with `take`.
+
+    Packets are decoded by `decoder` unless `put` names another one, a replay uses its own
+    so the layouts learned from the device are still there when it stops.
+    """
+
+    batch_callbacks: List[Callable[[TraceBatch], None]]
+
+    def __init__(self, decoder: TraceDecoder) -> None:
+        self.decoder = decoder
+        self.batch_callbacks = []
+
+        self.log = logging.getLogger("trace decoder")
+
+        self.receive_queue = Queue()
+        self._pending: List[TraceBatch] = []
+        self._pending_lock = threading.Lock()
+
+        self.decode_thread = threading.Thread(target=self.decode_task, daemon=True)
+        self.decode_thread.start()
+
+    def put(self, packet: bytes, timestamp: int | None = None, *, decoder: TraceDecoder | None = None):
+        """Eros channel callback, stamps the packet with its receive time.
+
+        This is the only clock read for a packet, the graphs and outputs all use this stamp.
+        A replay passes the recorded time instead, in time.monotonic_ns() like the clock.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+        self.receive_queue.put((timestamp, packet, decoder or self.decoder))
+
+    def decode_task(self):
+        while True:
+            # Group all the packets in the queue
+            items = [self.receive_queue.get()]
+            try:
+                while True:
+                    items.append(self.receive_queue.get_nowait())
+            except Empty:
+                pass
+
+            # Runs of packets for the same decoder, in the order they were received
+            start = 0
+            for i in range(1, len(items) + 1):
+                if i < len(items) and items[i][2] is items[start][2]:
+                    continue
+                self.decode(items[start][2], items[start:i])
+                start = i
+
+    def decode(self, decoder: TraceDecoder, items: List[Tuple[int, bytes, TraceDecoder]]):
+        timestamps = [item[0] for item in items]
+        packets = [item[1] for item in items]
+
+        try:
+            batch = decoder.decode(packets, timestamps)
+        except Exception:
+            self.log.exception("Failed to decode trace packets")
+            return
+
+        if len(batch) == 0:
+            return
+
+        for callback in self.batch_callbacks:
+            try:
+                callback(batch)
+            except Exception:
+                self.log.exception("Trace batch callback failed")
+
+        with self._pending_lock:
+            self._pending.append(batch)
+
+    def take(self) -> TraceBatch:
+        """Return everything decoded since the last call as a single batch"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+
+        return TraceBatch.concat(pending)
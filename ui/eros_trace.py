@@ -15,9 +15,10 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QFont, QFontDatabase, QGradient, QIcon,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
-from PySide6.QtWidgets import (QApplication, QFrame, QHBoxLayout, QHeaderView,
-    QLabel, QPushButton, QSizePolicy, QSpacerItem,
-    QTreeWidget, QTreeWidgetItem, QVBoxLayout, QWidget)
+from PySide6.QtWidgets import (QApplication, QComboBox, QFrame, QHBoxLayout,
+    QHeaderView, QLabel, QPushButton, QSizePolicy,
+    QSlider, QSpacerItem, QTreeView, QVBoxLayout,
+    QWidget)
 
 class Ui_Form(object):
     def setupUi(self, Form):
@@ -41,18 +42,36 @@ class Ui_Form(object):
 
         self.horizontalLayout.addWidget(self.udp_btn)
 
+        self.zmq_btn = QPushButton(self.frame)
+        self.zmq_btn.setObjectName(u"zmq_btn")
+        self.zmq_btn.setMaximumSize(QSize(100, 16777215))
+
+        self.horizontalLayout.addWidget(self.zmq_btn)
+
         self.logger_btn = QPushButton(self.frame)
         self.logger_btn.setObjectName(u"logger_btn")
         self.logger_btn.setMaximumSize(QSize(100, 16777215))
 
         self.horizontalLayout.addWidget(self.logger_btn)
 
+        self.record_btn = QPushButton(self.frame)
+        self.record_btn.setObjectName(u"record_btn")
+        self.record_btn.setMaximumSize(QSize(120, 16777215))
+
+        self.horizontalLayout.addWidget(self.record_btn)
+
         self.plotter_btn = QPushButton(self.frame)
         self.plotter_btn.setObjectName(u"plotter_btn")
         self.plotter_btn.setMaximumSize(QSize(150, 16777215))
 
         self.horizontalLayout.addWidget(self.plotter_btn)
 
+        self.spectrum_btn = QPushButton(self.frame)
+        self.spectrum_btn.setObjectName(u"spectrum_btn")
+        self.spectrum_btn.setMaximumSize(QSize(150, 16777215))
+
+        self.horizontalLayout.addWidget(self.spectrum_btn)
+
         self.horizontalSpacer = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
 
         self.horizontalLayout.addItem(self.horizontalSpacer)
@@ -69,16 +88,15 @@ class Ui_Form(object):
 
         self.verticalLayout.addWidget(self.label)
 
-        self.data_viewer = QTreeWidget(Form)
-        __qtreewidgetitem = QTreeWidgetItem()
-        __qtreewidgetitem.setText(0, u"1");
-        self.data_viewer.setHeaderItem(__qtreewidgetitem)
+        self.data_viewer = QTreeView(Form)
         self.data_viewer.setObjectName(u"data_viewer")
         sizePolicy = QSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
         sizePolicy.setHeightForWidth(self.data_viewer.sizePolicy().hasHeightForWidth())
         self.data_viewer.setSizePolicy(sizePolicy)
+        self.data_viewer.setRootIsDecorated(False)
+        self.data_viewer.setUniformRowHeights(True)
 
         self.verticalLayout.addWidget(self.data_viewer)
 
@@ -98,6 +116,42 @@ class Ui_Form(object):
 
         self.horizontalLayout_2.addItem(self.horizontalSpacer_2)
 
+        self.replay_btn = QPushButton(self.frame_2)
+        self.replay_btn.setObjectName(u"replay_btn")
+        self.replay_btn.setMaximumSize(QSize(120, 16777215))
+
+        self.horizontalLayout_2.addWidget(self.replay_btn)
+
+        self.replay_pause_btn = QPushButton(self.frame_2)
+        self.replay_pause_btn.setObjectName(u"replay_pause_btn")
+        self.replay_pause_btn.setMaximumSize(QSize(80, 16777215))
+
+        self.horizontalLayout_2.addWidget(self.replay_pause_btn)
+
+        self.replay_speed = QComboBox(self.frame_2)
+        self.replay_speed.addItem("")
+        self.replay_speed.addItem("")
+        self.replay_speed.addItem("")
+        self.replay_speed.addItem("")
+        self.replay_speed.addItem("")
+        self.replay_speed.addItem("")
+        self.replay_speed.setObjectName(u"replay_speed")
+
+        self.horizontalLayout_2.addWidget(self.replay_speed)
+
+        self.replay_slider = QSlider(self.frame_2)
+        self.replay_slider.setObjectName(u"replay_slider")
+        self.replay_slider.setMinimumSize(QSize(150, 0))
+        self.replay_slider.setMaximum(1000)
+        self.replay_slider.setOrientation(Qt.Horizontal)
+
+        self.horizontalLayout_2.addWidget(self.replay_slider)
+
+        self.replay_label = QLabel(self.frame_2)
+        self.replay_label.setObjectName(u"replay_label")
+
+        self.horizontalLayout_2.addWidget(self.replay_label)
+
 
         self.verticalLayout.addWidget(self.frame_2)
 
@@ -110,9 +164,23 @@ class Ui_Form(object):
     def retranslateUi(self, Form):
         Form.setWindowTitle(QCoreApplication.translate("Form", u"Form", None))
         self.udp_btn.setText(QCoreApplication.translate("Form", u"Start udp", None))
+        self.zmq_btn.setText(QCoreApplication.translate("Form", u"Start ZMQ", None))
         self.logger_btn.setText(QCoreApplication.translate("Form", u"Start logger", None))
+        self.record_btn.setText(QCoreApplication.translate("Form", u"Start recording", None))
         self.plotter_btn.setText(QCoreApplication.translate("Form", u"Graph selected", None))
+        self.spectrum_btn.setText(QCoreApplication.translate("Form", u"Spectrum selected", None))
         self.label.setText(QCoreApplication.translate("Form", u"TextLabel", None))
         self.clear_btn.setText(QCoreApplication.translate("Form", u"Clear list", None))
+        self.replay_btn.setText(QCoreApplication.translate("Form", u"Replay file", None))
+        self.replay_pause_btn.setText(QCoreApplication.translate("Form", u"Pause", None))
+        self.replay_speed.setItemText(0, QCoreApplication.translate("Form", u"0.5x", None))
+        self.replay_speed.setItemText(1, QCoreApplication.translate("Form", u"1x", None))
+        self.replay_speed.setItemText(2, QCoreApplication.translate("Form", u"2x", None))
+        self.replay_speed.setItemText(3, QCoreApplication.translate("Form", u"5x", None))
+        self.replay_speed.setItemText(4, QCoreApplication.translate("Form", u"10x", None))
+        self.replay_speed.setItemText(5, QCoreApplication.translate("Form", u"Max", None))
+
+        self.replay_speed.setCurrentIndex(1)
+        self.replay_label.setText("")
     # retranslateUi
 